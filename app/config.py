@@ -4,8 +4,124 @@ class Config:
 
     MONGO_URI = os.getenv('MONGO_URI')
     MONGO_DB_NAME = os.getenv('MONGO_DB_NAME')
+
+    # Document vector store
+    VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'opensearch')  # opensearch | faiss
+    FAISS_INDEX_PATH = os.getenv('FAISS_INDEX_PATH', 'faiss.index')
+    FAISS_INDEX_FACTORY = os.getenv('FAISS_INDEX_FACTORY', 'Flat')  # e.g. HNSW32, IVF1024,Flat, IVF1024,PQ48, SQ8
+    FAISS_EF_SEARCH = int(os.getenv('FAISS_EF_SEARCH', '64'))  # HNSW
+    FAISS_NPROBE = int(os.getenv('FAISS_NPROBE', '16'))  # IVF
+    FAISS_TRAIN_SIZE = int(os.getenv('FAISS_TRAIN_SIZE', '50000'))  # vectors buffered before training IVF/PQ
+    FAISS_MMAP = os.getenv('FAISS_MMAP', 'true').lower() == 'true'
+    FAISS_WAL = os.getenv('FAISS_WAL', 'true').lower() == 'true'
+    FAISS_WAL_FSYNC = os.getenv('FAISS_WAL_FSYNC', 'true').lower() == 'true'
+    FAISS_COMPACT_RATIO = float(os.getenv('FAISS_COMPACT_RATIO', '0.2'))  # HNSW is rebuilt once this fraction of its vectors is deleted
+    FAISS_SNAPSHOT_INTERVAL = float(os.getenv('FAISS_SNAPSHOT_INTERVAL', '300'))  # seconds, 0 disables
+
+    # Retrieval
+    RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'vector')  # vector | hybrid
+    HYBRID_FUSION = os.getenv('HYBRID_FUSION', 'rrf')  # rrf | weighted
+    HYBRID_LEXICAL_WEIGHT = float(os.getenv('HYBRID_LEXICAL_WEIGHT', '0.5'))
+    HYBRID_VECTOR_WEIGHT = float(os.getenv('HYBRID_VECTOR_WEIGHT', '0.5'))
+    HYBRID_CANDIDATES_FACTOR = int(os.getenv('HYBRID_CANDIDATES_FACTOR', '2'))  # per-query candidates = factor * k
+    HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', '60'))
+    # Cross-encoder reranking of the first-stage candidates
+    RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'false').lower() == 'true'
+    RERANK_MODEL_NAME = os.getenv('RERANK_MODEL_NAME', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+    RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', '20'))  # candidates fetched before reranking
+    RERANK_MAX_CANDIDATES = int(os.getenv('RERANK_MAX_CANDIDATES', '100'))  # upper bound for per-request overrides
+    RERANK_BATCH_SIZE = int(os.getenv('RERANK_BATCH_SIZE', '32'))
+    RERANK_CACHE_SIZE = int(os.getenv('RERANK_CACHE_SIZE', '10000'))  # cached (query, document) scores
+    RETRIEVAL_COLLAPSE_CHUNKS = os.getenv('RETRIEVAL_COLLAPSE_CHUNKS', 'false').lower() == 'true'  # one result per parent document
+
+    # Ingestion: content-hash ids, texts already stored are skipped before embedding
+    INGEST_DEDUP = os.getenv('INGEST_DEDUP', 'true').lower() == 'true'
+    # Background ingestion jobs (/docs/jobs)
+    INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '0'))  # embedding processes, 0 = one per core
+    INGEST_WORKER_NICENESS = int(os.getenv('INGEST_WORKER_NICENESS', '10'))  # lower priority than request handling
+    INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '256'))  # chunks per embedding task and bulk batch
+    INGEST_MAX_JOBS = int(os.getenv('INGEST_MAX_JOBS', '100'))  # finished jobs kept for status queries
+    INGEST_MAX_QUEUED = int(os.getenv('INGEST_MAX_QUEUED', '16'))  # jobs waiting to run, beyond that /docs/jobs answers 429
+
+    # Chunking at ingestion (token counts use the embedding model's tokenizer)
+    CHUNKING_ENABLED = os.getenv('CHUNKING_ENABLED', 'true').lower() == 'true'
+    CHUNK_TOKENS = int(os.getenv('CHUNK_TOKENS', '200'))  # all-MiniLM-L6-v2 truncates at 256
+    CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '40'))
+    CHUNK_COLLAPSE_FACTOR = int(os.getenv('CHUNK_COLLAPSE_FACTOR', '3'))  # chunks fetched per requested parent
+
     OPENSEARCH_USER = os.getenv('OPENSEARCH_USER')
     OPENSEARCH_PASSWORD = os.getenv('OPENSEARCH_INITIAL_ADMIN_PASSWORD')
+    OPENSEARCH_BULK_CHUNK_SIZE = int(os.getenv('OPENSEARCH_BULK_CHUNK_SIZE', '500'))
+    # k-NN index settings, applied to new indices (use /docs/reindex to apply them to existing data)
+    OPENSEARCH_KNN_ENGINE = os.getenv('OPENSEARCH_KNN_ENGINE', 'faiss')  # faiss | lucene | nmslib
+    OPENSEARCH_SPACE_TYPE = os.getenv('OPENSEARCH_SPACE_TYPE', 'l2')  # l2 | cosinesimil | innerproduct
+    OPENSEARCH_HNSW_M = int(os.getenv('OPENSEARCH_HNSW_M', '16'))
+    OPENSEARCH_HNSW_EF_CONSTRUCTION = int(os.getenv('OPENSEARCH_HNSW_EF_CONSTRUCTION', '128'))
+    OPENSEARCH_HNSW_EF_SEARCH = int(os.getenv('OPENSEARCH_HNSW_EF_SEARCH', '100'))
+    OPENSEARCH_SHARDS = int(os.getenv('OPENSEARCH_SHARDS', '1'))
+    OPENSEARCH_REPLICAS = int(os.getenv('OPENSEARCH_REPLICAS', '1'))
+    OPENSEARCH_PIT_KEEP_ALIVE = os.getenv('OPENSEARCH_PIT_KEEP_ALIVE', '5m')  # how long a list-docs cursor stays valid between pages
+    OPENSEARCH_VECTOR_ENCODING = os.getenv('OPENSEARCH_VECTOR_ENCODING', 'float')  # float | fp16 | byte
+
+    # Ollama
+    OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://ollama:11434')
+    OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama3')
+    OLLAMA_MAX_CONNECTIONS = int(os.getenv('OLLAMA_MAX_CONNECTIONS', '100'))
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OLLAMA_MAX_KEEPALIVE_CONNECTIONS', '20'))
+    OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv('OLLAMA_KEEPALIVE_EXPIRY', '30'))
+    OLLAMA_CONNECT_TIMEOUT = float(os.getenv('OLLAMA_CONNECT_TIMEOUT', '5'))
+    OLLAMA_READ_TIMEOUT = float(os.getenv('OLLAMA_READ_TIMEOUT', '60'))
+    # Backend pool: chats go to the healthy backend with the fewest requests in flight
+    OLLAMA_URLS = [url.strip() for url in os.getenv('OLLAMA_URLS', OLLAMA_URL).split(',') if url.strip()]  # all serving OLLAMA_MODEL
+    OLLAMA_MAX_CONCURRENCY = int(os.getenv('OLLAMA_MAX_CONCURRENCY', '4'))  # in-flight chats per backend, match OLLAMA_NUM_PARALLEL
+    OLLAMA_QUEUE_SIZE = int(os.getenv('OLLAMA_QUEUE_SIZE', '32'))  # chats waiting for a free backend, beyond that 429
+    OLLAMA_QUEUE_TIMEOUT = float(os.getenv('OLLAMA_QUEUE_TIMEOUT', '10'))  # longest wait for a backend before 503
+    OLLAMA_HEALTH_INTERVAL = float(os.getenv('OLLAMA_HEALTH_INTERVAL', '10'))  # seconds between health checks, 0 disables
+    OLLAMA_HEALTH_TIMEOUT = float(os.getenv('OLLAMA_HEALTH_TIMEOUT', '2'))
+    OLLAMA_MAX_FAILURES = int(os.getenv('OLLAMA_MAX_FAILURES', '3'))  # consecutive failed chats before a backend is ejected
+    OLLAMA_EJECT_COOLDOWN = float(os.getenv('OLLAMA_EJECT_COOLDOWN', '30'))  # with health checks off, seconds before an ejected backend is probed again
+
+    # Chat sessions
+    SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'memory')  # memory | mongo
+    SESSION_MAX_SESSIONS = int(os.getenv('SESSION_MAX_SESSIONS', '10000'))
+    SESSION_TTL_SECONDS = float(os.getenv('SESSION_TTL_SECONDS', '86400'))
+    SESSION_MAX_MESSAGES = int(os.getenv('SESSION_MAX_MESSAGES', '200'))
+
+    # Conversation history sent to the model on /llm/chat
+    HISTORY_MAX_TURNS = int(os.getenv('HISTORY_MAX_TURNS', '10'))
+    HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', '3000'))
+    HISTORY_SUMMARIZE = os.getenv('HISTORY_SUMMARIZE', 'false').lower() == 'true'
+    HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv('HISTORY_SUMMARY_CACHE_SIZE', '1000'))
+    HISTORY_TOKEN_CACHE_SIZE = int(os.getenv('HISTORY_TOKEN_CACHE_SIZE', '100000'))
+
+    # Semantic answer cache for /llm/rag-chat
+    ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'false').lower() == 'true'
+    ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))  # cosine similarity
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '1000'))
+
+    # Embedding
+    EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+    EMBEDDING_DIM = int(os.getenv('EMBEDDING_DIM', '384'))  # of EMBEDDING_MODEL_NAME; verified when the model loads
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')  # torch | onnx
+    EMBEDDING_ONNX_FILE = os.getenv('EMBEDDING_ONNX_FILE', 'onnx/model.onnx')  # e.g. onnx/model_quint8_avx2.onnx (int8)
+    EMBEDDING_THREADS = int(os.getenv('EMBEDDING_THREADS', '0'))  # intra-op threads, 0 = runtime default
+    EMBEDDING_PARITY_CHECK = os.getenv('EMBEDDING_PARITY_CHECK', 'false').lower() == 'true'  # compare onnx with torch at startup
+    EMBEDDING_PARITY_MIN_COSINE = float(os.getenv('EMBEDDING_PARITY_MIN_COSINE', '0.99'))
+    EMBEDDING_MAX_BATCH_SIZE = int(os.getenv('EMBEDDING_MAX_BATCH_SIZE', '32'))
+    EMBEDDING_MAX_WAIT_MS = float(os.getenv('EMBEDDING_MAX_WAIT_MS', '5'))
+    EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '10000'))
+    EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH')  # e.g. /app/data/embedding_cache
+    EMBEDDING_CACHE_DISK_ENTRIES = int(os.getenv('EMBEDDING_CACHE_DISK_ENTRIES', '100000'))
+
+    # Startup
+    WARMUP_IN_BACKGROUND = os.getenv('WARMUP_IN_BACKGROUND', 'true').lower() == 'true'  # serve while models load; see /ready
+
+    # Per-request profiling (X-Profile: 1 header or ?profile=1)
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_TOKEN = os.getenv('PROFILING_TOKEN')  # if set, required in the X-Profile-Token header
+    PROFILING_DIR = os.getenv('PROFILING_DIR', 'profiles')  # folded stacks and span trees, one pair per request
+    PROFILING_INTERVAL_MS = float(os.getenv('PROFILING_INTERVAL_MS', '5'))  # stack sampling interval
+    PROFILING_HEADER_MAX_BYTES = int(os.getenv('PROFILING_HEADER_MAX_BYTES', '4096'))  # X-Profile-Spans is trimmed to fit
 
 
 # Optional: Create a function to print the config for debugging
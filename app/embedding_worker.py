@@ -0,0 +1,54 @@
+"""
+Embedding model loading, shared by `EmbeddingManager`, and the entry points
+of the embedding worker processes used by background ingestion.
+
+This module is deliberately standalone: worker processes are spawned and
+import it by name, and importing `external_services` there would load every
+manager (and the model) a second time.
+"""
+import os
+
+import numpy as np
+
+_model = None
+
+
+def load_model(model_name: str, backend: str = "torch", onnx_file: str = None, threads: int = 0):
+    """
+    Load a SentenceTransformer on CPU with the PyTorch or ONNX Runtime
+    backend. `onnx_file` selects an export inside the model repository, e.g.
+    `onnx/model_quint8_avx2.onnx` for the int8-quantized all-MiniLM-L6-v2.
+    `threads` > 0 caps the intra-op threads of either runtime.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        if onnx_file:
+            model_kwargs["file_name"] = onnx_file
+        if threads > 0:
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+            model_kwargs["session_options"] = options
+        return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+    if threads > 0:
+        import torch
+
+        torch.set_num_threads(threads)
+    return SentenceTransformer(model_name, device="cpu")
+
+
+def init_worker(model_name: str, backend: str = "torch", onnx_file: str = None, threads: int = 1, niceness: int = 0):
+    global _model
+    if niceness:
+        # Leave CPU headroom for request handling in the API process
+        os.nice(niceness)
+    _model = load_model(model_name, backend, onnx_file, threads)
+
+
+def embed(texts, batch_size: int = 32) -> np.ndarray:
+    return np.asarray(_model.encode(texts, batch_size=batch_size, convert_to_numpy=True), dtype=np.float32)
@@ -1,10 +1,31 @@
 from external_services.mongo_manager import MongoManager
-from external_services.faiss_manager import FaissManager
-from external_services.opensearch_manager import OpenSearchManager
+from external_services.embedding_manager import EmbeddingManager
+from external_services.ollama_manager import OllamaManager
+from external_services.answer_cache import AnswerCache
+from external_services.chunker import Chunker
+from external_services.reranker import Reranker
+from external_services.ingestion import IngestionManager
+from external_services.session_store import InMemorySessionStore, MongoSessionStore
+from config import Config
+import startup
 
 
+# Constructing the managers is cheap: models load on first use or during the
+# lifespan warm-up, connections are opened in the lifespan.
 dbm = MongoManager()
-fm = FaissManager()
-osm = OpenSearchManager()
-
-
+em = EmbeddingManager()
+# Document store used by the routers; only the configured backend is imported
+if Config.VECTOR_BACKEND == "faiss":
+    with startup.timed("faiss", "import"):
+        from external_services.faiss_manager import FaissManager
+    vs = FaissManager(vector_dim=em.vector_dim, index_path=Config.FAISS_INDEX_PATH, embedder=em)
+else:
+    with startup.timed("opensearch", "import"):
+        from external_services.opensearch_manager import OpenSearchManager
+    vs = OpenSearchManager(vector_dim=em.vector_dim, embedder=em)
+om = OllamaManager()
+ac = AnswerCache(vector_dim=em.vector_dim)
+ch = Chunker(embedder=em)
+rr = Reranker()
+im = IngestionManager(store=vs, chunker=ch, embedder=em)
+ss = MongoSessionStore(dbm) if Config.SESSION_BACKEND == "mongo" else InMemorySessionStore()
@@ -0,0 +1,123 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+import metrics
+from config import Config
+
+
+logger = logging.getLogger(__name__)
+
+class AnswerCache:
+    """
+    Semantic cache of RAG answers keyed on the query embedding.
+
+    Query vectors are normalized and kept in an inner-product FAISS index,
+    so a lookup is a cosine-similarity search. A cached answer is returned
+    when a cached query is within `threshold`, was answered with the same
+    retrieval settings (`fingerprint`) and the document index has not
+    changed since the answer was cached (`invalidate` bumps the generation).
+    The oldest entries are evicted past `max_entries`.
+    """
+
+    # Nearest cached queries checked for one with a matching fingerprint
+    LOOKUP_CANDIDATES = 8
+
+    def __init__(
+        self,
+        vector_dim: int,
+        threshold: float = Config.ANSWER_CACHE_THRESHOLD,
+        max_entries: int = Config.ANSWER_CACHE_MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.vector_dim = vector_dim
+        self.fm = None  # created on the first store, so faiss is only imported when the cache is used
+
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+
+        self._entries = OrderedDict()  # faiss id -> (generation, fingerprint, answer, documents)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, query_vector: np.ndarray, fingerprint: str = "") -> Optional[dict]:
+        query = self._normalize(query_vector)
+        with self._lock:
+            if self._entries:
+                scores, ids = self.fm.search_vectors(query, min(self.LOOKUP_CANDIDATES, len(self._entries)))
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if score < self.threshold:
+                        break
+                    entry = self._entries.get(int(entry_id))
+                    if entry is not None and entry[0] == self.generation and entry[1] == fingerprint:
+                        self.hits += 1
+                        metrics.record_cache("answer", 1, 0)
+                        return {"response": entry[2], "documents": entry[3], "similarity": float(score)}
+            self.misses += 1
+            metrics.record_cache("answer", 0, 1)
+            return None
+
+    def store(
+        self,
+        query_vector: np.ndarray,
+        answer: str,
+        documents: List[str],
+        generation: Optional[int] = None,
+        fingerprint: str = "",
+    ):
+        """
+        Cache `answer`. Pass the `generation` read before retrieval so that an
+        answer built from documents that changed meanwhile is not cached, and
+        a `fingerprint` of the retrieval settings the documents came from.
+        """
+        query = self._normalize(query_vector)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self.fm is None:
+                from external_services.faiss_manager import FaissManager
+
+                self.fm = FaissManager(vector_dim=self.vector_dim, index_path=None, metric="ip", index_factory="Flat", use_mmap=False)
+                self.fm.reset_index()
+            entry_id = self._next_id
+            self._next_id += 1
+            self.fm.add_embeddings(query, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (self.generation, fingerprint, answer, documents)
+            if len(self._entries) > self.max_entries:
+                evicted = []
+                while len(self._entries) > self.max_entries:
+                    evicted.append(self._entries.popitem(last=False)[0])
+                self.fm.remove_ids(np.array(evicted, dtype=np.int64))
+
+    def invalidate(self):
+        """
+        Drop every cached answer; called whenever the document index changes.
+        """
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            if self.fm is not None:
+                self.fm.reset_index()
+        logger.debug(f"Answer cache invalidated (generation {self.generation}).")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "generation": self.generation,
+        }
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        query = np.asarray(vector, dtype=np.float32).reshape(1, -1).copy()
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query /= norm
+        return query
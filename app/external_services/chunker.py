@@ -0,0 +1,129 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+
+WORD_RE = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END = ".!?\n"
+
+class Chunker:
+    """
+    Splits documents into overlapping chunks of at most `chunk_tokens`
+    tokens, counted with the embedding model's tokenizer so that no chunk
+    is truncated by the model. Chunk boundaries are moved back to the end
+    of a sentence when one falls in the last quarter of the window.
+
+    Each chunk carries `parent_id`, `chunk_index`, `chunk_count` and the
+    `start`/`end` character offsets into the parent text, which is enough
+    to rebuild the parent from its chunks.
+    """
+
+    def __init__(
+        self,
+        embedder=None,
+        chunk_tokens: int = Config.CHUNK_TOKENS,
+        overlap_tokens: int = Config.CHUNK_OVERLAP_TOKENS,
+    ):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("CHUNK_OVERLAP_TOKENS must be smaller than CHUNK_TOKENS")
+        self.embedder = embedder
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def _token_spans(self, text: str) -> List[Tuple[int, int]]:
+        if self.embedder is not None:
+            return self.embedder.token_spans(text)
+        return [m.span() for m in WORD_RE.finditer(text)]
+
+    def split(self, text: str) -> List[Tuple[int, int]]:
+        """
+        Return the `(start, end)` character ranges of the chunks of `text`.
+        """
+        spans = self._token_spans(text)
+        if len(spans) <= self.chunk_tokens:
+            return [(0, len(text))]
+
+        ranges = []
+        first = 0
+        while first < len(spans):
+            last = min(first + self.chunk_tokens, len(spans))
+            if last < len(spans):
+                # Prefer ending on a sentence boundary near the end of the window
+                for i in range(last - 1, first + (self.chunk_tokens * 3) // 4, -1):
+                    if text[spans[i][1] - 1] in SENTENCE_END:
+                        last = i + 1
+                        break
+            ranges.append((spans[first][0], spans[last - 1][1]))
+            if last == len(spans):
+                break
+            first = max(last - self.overlap_tokens, first + 1)
+        return ranges
+
+    def chunk(self, parent_id: str, text: str, metadata: Optional[dict] = None) -> List[Dict]:
+        """
+        Split one document into `{"id", "text", "metadata"}` chunks. A
+        document that fits in one chunk keeps `parent_id` as its id; longer
+        ones get `<parent_id>:<n>`.
+        """
+        ranges = self.split(text)
+        chunks = []
+        for i, (start, end) in enumerate(ranges):
+            chunks.append({
+                "id": parent_id if len(ranges) == 1 else chunk_id(parent_id, i),
+                "text": text[start:end],
+                "metadata": {
+                    **(metadata or {}),
+                    "parent_id": parent_id,
+                    "chunk_index": i,
+                    "chunk_count": len(ranges),
+                    "start": start,
+                    "end": end,
+                },
+            })
+        return chunks
+
+
+def chunk_id(parent_id: str, index: int) -> str:
+    return f"{parent_id}:{index}"
+
+
+def parent_id_of(doc: dict) -> str:
+    return (doc.get("metadata") or {}).get("parent_id", doc["id"])
+
+
+def chunk_ids_of(doc: dict) -> List[str]:
+    """
+    Ids of every chunk belonging to the same parent as `doc`.
+    """
+    metadata = doc.get("metadata") or {}
+    count = metadata.get("chunk_count", 1)
+    if count <= 1:
+        return [doc["id"]]
+    return [chunk_id(metadata["parent_id"], i) for i in range(count)]
+
+
+def join_chunks(chunks: List[dict]) -> str:
+    """
+    Rebuild a parent text from its chunks using their character offsets,
+    dropping the overlapping part of each chunk.
+    """
+    chunks = sorted(chunks, key=lambda c: c["metadata"].get("chunk_index", 0))
+    text = ""
+    position = 0
+    for chunk in chunks:
+        start = chunk["metadata"].get("start", position)
+        end = chunk["metadata"].get("end", start + len(chunk["text"]))
+        if end <= position:
+            continue
+        if start > position:
+            # Missing chunk; keep the gap visible rather than splicing text
+            text += " … "
+            position = start
+        text += chunk["text"][position - start:]
+        position = end
+    return text
+
+
+def strip_chunk_metadata(metadata: dict) -> dict:
+    return {k: v for k, v in (metadata or {}).items() if k not in ("parent_id", "chunk_index", "chunk_count", "start", "end")}
@@ -0,0 +1,191 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache of embeddings keyed by model name + a hash of the text.
+
+    When `path` is given, embeddings are also written to an on-disk store so
+    they survive restarts: `<path>.f32` holds memory-mapped float32 rows and
+    `<path>.idx` is an append-only "key row" index. The disk store is a ring
+    of `disk_entries` rows; the oldest rows are overwritten once it is full.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        vector_dim: int,
+        max_entries: int = 10000,
+        path: Optional[str] = None,
+        disk_entries: int = 100000,
+    ):
+        self.model_name = model_name
+        self.vector_dim = vector_dim
+        self.max_entries = max_entries
+        self.path = path
+        self.disk_entries = disk_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._rows = None
+        self._disk_index: Dict[str, int] = {}
+        self._row_keys: Dict[int, str] = {}
+        self._next_row = 0
+        self._index_file = None
+        self._index_lines = 0
+        if self.path:
+            self._open_disk_store()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        results = []
+        with self._lock:
+            for text in texts:
+                vector = self._get(self.key(text))
+                if vector is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                results.append(vector)
+        return results
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                self._put_memory(key, vector)
+                if self._rows is not None and key not in self._disk_index:
+                    self._put_disk(key, vector)
+            if self._index_file is not None:
+                self._index_file.flush()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._disk_index),
+        }
+
+    def flush(self):
+        with self._lock:
+            if self._rows is not None:
+                self._rows.flush()
+            if self._index_file is not None:
+                self._index_file.flush()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._index_file is not None:
+                self._index_file.close()
+                self._index_file = None
+
+    def _get(self, key: str) -> Optional[np.ndarray]:
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            return vector
+        row = self._disk_index.get(key)
+        if row is None:
+            return None
+        vector = np.array(self._rows[row])
+        self._put_memory(key, vector)
+        return vector
+
+    def _put_memory(self, key: str, vector: np.ndarray):
+        if self.max_entries <= 0:
+            return
+        # Copy: `vector` is usually a row view that would keep its whole batch alive
+        self._memory[key] = np.array(vector, dtype=np.float32, copy=True)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # --- Disk store ---
+
+    def _open_disk_store(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        rows_path = f"{self.path}.f32"
+        index_path = f"{self.path}.idx"
+
+        expected_size = self.disk_entries * self.vector_dim * np.dtype(np.float32).itemsize
+        if os.path.exists(rows_path) and os.path.getsize(rows_path) != expected_size:
+            # Written with another EMBEDDING_CACHE_DISK_ENTRIES or model dimension, rows would be misread
+            logger.warning(f"Embedding cache at {self.path} does not match {self.disk_entries}x{self.vector_dim}, rebuilding it.")
+            os.remove(rows_path)
+            if os.path.exists(index_path):
+                os.remove(index_path)
+
+        mode = "r+" if os.path.exists(rows_path) else "w+"
+        self._rows = np.memmap(rows_path, dtype=np.float32, mode=mode, shape=(self.disk_entries, self.vector_dim))
+
+        if os.path.exists(index_path):
+            with open(index_path, "r") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) != 2:
+                        continue
+                    key, row = parts[0], int(parts[1])
+                    if row >= self.disk_entries:
+                        continue
+                    self._assign_row(key, row)
+                    self._next_row = (row + 1) % self.disk_entries
+                    self._index_lines += 1
+        self._index_file = open(index_path, "a")
+        logger.info(f"Embedding cache loaded {len(self._disk_index)} entries from {self.path}.")
+
+        if self._index_lines > 2 * self.disk_entries:
+            self._compact_index()
+
+    def _assign_row(self, key: str, row: int):
+        previous = self._row_keys.get(row)
+        if previous is not None and previous != key:
+            self._disk_index.pop(previous, None)
+        self._row_keys[row] = key
+        self._disk_index[key] = row
+
+    def _put_disk(self, key: str, vector: np.ndarray):
+        row = self._next_row
+        self._rows[row] = vector
+        self._assign_row(key, row)
+        self._next_row = (row + 1) % self.disk_entries
+        self._index_file.write(f"{key} {row}\n")
+        self._index_lines += 1
+        if self._index_lines > 2 * self.disk_entries:
+            self._compact_index()
+
+    def _compact_index(self):
+        index_path = f"{self.path}.idx"
+        tmp_path = f"{index_path}.tmp"
+        # Write rows oldest-first so replaying the index restores the ring position
+        order = sorted(self._row_keys, key=lambda row: (row - self._next_row) % self.disk_entries)
+        self._rows.flush()
+        with open(tmp_path, "w") as f:
+            for row in order:
+                f.write(f"{self._row_keys[row]} {row}\n")
+        if self._index_file is not None:
+            self._index_file.close()
+        os.replace(tmp_path, index_path)
+        self._index_file = open(index_path, "a")
+        self._index_lines = len(order)
+        logger.debug(f"Compacted embedding cache index to {self._index_lines} entries.")
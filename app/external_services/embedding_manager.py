@@ -0,0 +1,284 @@
+import asyncio
+import gc
+import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Tuple, Union
+
+import numpy as np
+import embedding_worker
+import metrics
+import profiling
+from config import Config
+from external_services.embedding_cache import EmbeddingCache
+
+
+logger = logging.getLogger(__name__)
+
+PARITY_SAMPLE = [
+    "What is the capital of France?",
+    "Paris is the capital and most populous city of France.",
+    "The quick brown fox jumps over the lazy dog.",
+    "How do I reset my password?",
+    "Retrieval-augmented generation combines search with a language model.",
+    "OpenSearch supports approximate k-NN search with HNSW graphs.",
+    "Der schnelle braune Fuchs springt über den faulen Hund.",
+    "12345 67890",
+    "A very short one.",
+    "Embeddings map text to dense vectors so that similar meanings are close together in vector space, "
+    "which makes nearest-neighbour search a good proxy for semantic similarity.",
+]
+
+class EmbeddingManager:
+    """
+    Process-wide embedding service.
+
+    Concurrent `encode` calls are queued and picked up by a single worker
+    thread, which groups them into one `model.encode(list)` call bounded by
+    `max_batch_size` texts and `max_wait_ms` of waiting for more work.
+    Texts already in the embedding cache never reach the model.
+    """
+
+    def __init__(
+        self,
+        model_name: str = Config.EMBEDDING_MODEL_NAME,
+        max_batch_size: int = Config.EMBEDDING_MAX_BATCH_SIZE,
+        max_wait_ms: float = Config.EMBEDDING_MAX_WAIT_MS,
+        backend: str = Config.EMBEDDING_BACKEND,
+        onnx_file: str = Config.EMBEDDING_ONNX_FILE,
+        threads: int = Config.EMBEDDING_THREADS,
+        vector_dim: int = Config.EMBEDDING_DIM,
+    ):
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.backend = backend
+        self.onnx_file = onnx_file if backend == "onnx" else None
+        self.threads = threads
+
+        # The model is loaded on first use or by `load()` during warm-up
+        self.model = None
+        self.vector_dim = vector_dim
+        self._load_lock = threading.Lock()
+        self._parity_lock = threading.Lock()
+
+        self.cache = None
+        if Config.EMBEDDING_CACHE_SIZE > 0 or Config.EMBEDDING_CACHE_PATH:
+            self.cache = EmbeddingCache(
+                # Quantized exports give slightly different vectors; keep their cache entries apart
+                model_name=self.model_name if self.onnx_file is None else f"{self.model_name}|{self.onnx_file}",
+                vector_dim=self.vector_dim,
+                max_entries=Config.EMBEDDING_CACHE_SIZE,
+                path=Config.EMBEDDING_CACHE_PATH,
+                disk_entries=Config.EMBEDDING_CACHE_DISK_ENTRIES,
+            )
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def load(self):
+        if self.model is not None:
+            return self.model
+        with self._load_lock:
+            if self.model is None:
+                logger.info(f"Loading embedding model '{self.model_name}' ({self.backend}{', ' + self.onnx_file if self.onnx_file else ''})...")
+                model = embedding_worker.load_model(self.model_name, self.backend, self.onnx_file, self.threads)
+                dim = model.get_sentence_embedding_dimension()
+                if dim != self.vector_dim:
+                    raise ValueError(f"Model '{self.model_name}' produces {dim}-d embeddings but EMBEDDING_DIM is {self.vector_dim}")
+                self.model = model
+        return self.model
+
+    def start(self):
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stopped = False
+            self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._worker.start()
+            logger.info(f"Embedding batcher started (max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait_ms}).")
+
+    def stop(self):
+        with self._lock:
+            if self._worker is None:
+                return
+            self._stopped = True
+            self._queue.put(None)
+            worker, self._worker = self._worker, None
+        worker.join(timeout=5)
+        if self.cache is not None:
+            self.cache.flush()
+        logger.info("Embedding batcher stopped.")
+
+    def encode(self, texts: Union[str, List[str]]) -> np.ndarray:
+        """
+        Embed a single text (returns a 1-d vector) or a list of texts (returns
+        a 2-d array), mirroring `SentenceTransformer.encode`.
+        """
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        if not batch:
+            return np.empty((0, self.vector_dim), dtype=np.float32)
+
+        with metrics.EMBEDDING_SECONDS.time(), profiling.span("embedding"):
+            cached, missing = self.lookup_cached(batch)
+            if missing:
+                texts = [batch[i] for i in missing]
+                if len(texts) >= self.max_batch_size:
+                    # Already a full batch, nothing to gain from coalescing
+                    vectors = self._encode_batch(texts)
+                else:
+                    vectors = self.submit(texts).result()
+                self.store_encoded(cached, missing, texts, vectors)
+        vectors = np.stack(cached)
+        return vectors[0] if single else vectors
+
+    async def aencode(self, texts: Union[str, List[str]]) -> np.ndarray:
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        if not batch:
+            return np.empty((0, self.vector_dim), dtype=np.float32)
+        with metrics.EMBEDDING_SECONDS.time(), profiling.span("embedding"):
+            cached, missing = self.lookup_cached(batch)
+            if missing:
+                texts = [batch[i] for i in missing]
+                vectors = await asyncio.wrap_future(self.submit(texts))
+                self.store_encoded(cached, missing, texts, vectors)
+        vectors = np.stack(cached)
+        return vectors[0] if single else vectors
+
+    def token_spans(self, text: str) -> List[Tuple[int, int]]:
+        """
+        Character offsets of the model's tokens in `text`, without special
+        tokens. Falls back to word/punctuation tokens when the tokenizer
+        cannot report offsets.
+        """
+        tokenizer = getattr(self.load(), "tokenizer", None)
+        if tokenizer is not None and getattr(tokenizer, "is_fast", False):
+            encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, truncation=False)
+            return [tuple(span) for span in encoded["offset_mapping"]]
+        return [m.span() for m in re.finditer(r"\w+|[^\w\s]", text)]
+
+    def parity_check(self, texts: List[str] = None, min_cosine: float = Config.EMBEDDING_PARITY_MIN_COSINE) -> dict:
+        """
+        Compare this model's embeddings with the reference PyTorch model on
+        `texts` (a built-in sample by default). Passes when every pair has a
+        cosine similarity of at least `min_cosine`.
+        """
+        if self.backend == "torch":
+            raise ValueError("The embedding backend is already PyTorch, there is nothing to compare it with")
+        texts = texts or PARITY_SAMPLE
+        # One reference model at a time, released right after: it is as large as the model it checks
+        with self._parity_lock:
+            reference = embedding_worker.load_model(self.model_name, "torch")
+            try:
+                expected = np.asarray(reference.encode(texts, batch_size=self.max_batch_size, convert_to_numpy=True), dtype=np.float32)
+            finally:
+                del reference
+                gc.collect()
+        actual = self._encode_batch(texts)
+        cosines = np.sum(expected * actual, axis=1) / (np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1))
+        result = {
+            "backend": self.backend,
+            "onnx_file": self.onnx_file,
+            "texts": len(texts),
+            "min_cosine": float(cosines.min()),
+            "mean_cosine": float(cosines.mean()),
+            "threshold": min_cosine,
+            "passed": bool(cosines.min() >= min_cosine),
+        }
+        log = logger.info if result["passed"] else logger.warning
+        log(f"Embedding parity vs torch: min cosine {result['min_cosine']:.5f}, mean {result['mean_cosine']:.5f} (threshold {min_cosine}).")
+        return result
+
+    def cache_stats(self) -> dict:
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+
+    def lookup_cached(self, texts: List[str]) -> Tuple[list, List[int]]:
+        """
+        Cached embeddings of `texts` (None where missing) and the positions
+        of the missing ones, for callers that encode those themselves.
+        """
+        if self.cache is None:
+            return [None] * len(texts), list(range(len(texts)))
+        cached = self.cache.get_many(texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        metrics.record_cache("embedding", len(texts) - len(missing), len(missing))
+        return cached, missing
+
+    def store_encoded(self, cached: list, missing: List[int], texts: List[str], vectors: np.ndarray):
+        """
+        Fill the `missing` slots of `cached` with the `vectors` encoded for
+        `texts` and add them to the cache.
+        """
+        for i, vector in zip(missing, vectors):
+            cached[i] = vector
+        if self.cache is not None:
+            self.cache.put_many(texts, vectors)
+
+    def submit(self, texts: List[str]) -> Future:
+        if self._worker is None:
+            self.start()
+        future = Future()
+        self._queue.put((texts, future))
+        return future
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(
+            self.load().encode(texts, batch_size=self.max_batch_size, convert_to_numpy=True),
+            dtype=np.float32,
+        )
+
+    def _collect(self, first):
+        pending = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                if self._stopped:
+                    return
+                continue
+
+            pending = self._collect(item)
+            texts = [text for batch, _ in pending for text in batch]
+            start = time.perf_counter()
+            try:
+                vectors = self._encode_batch(texts)
+            except Exception as e:
+                metrics.ERRORS.labels("embedding").inc()
+                logger.error(f"Embedding batch of {len(texts)} texts failed: {e}")
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            metrics.EMBEDDING_BATCH_SECONDS.observe(time.perf_counter() - start)
+            metrics.EMBEDDING_BATCH_SIZE.observe(len(texts))
+
+            logger.debug(f"Encoded batch of {len(texts)} texts from {len(pending)} callers.")
+            offset = 0
+            for batch, future in pending:
+                future.set_result(vectors[offset:offset + len(batch)])
+                offset += len(batch)
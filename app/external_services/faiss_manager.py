@@ -1,54 +1,542 @@
 import os
+import bisect
+import json
+import threading
 import faiss
 import numpy as np
 import logging
+from typing import List, Optional, Tuple, Union
+from config import Config
+from external_services.faiss_wal import WriteAheadLog
+from external_services.vector_store import VectorStore, check_add_lengths, decode_cursor, encode_cursor
 
 logger = logging.getLogger(__name__)
 
-class FaissManager:
-    def __init__(self, vector_dim=384, index_path="faiss.index"):
+class FaissManager(VectorStore):
+    """
+    In-process FAISS index. As a `VectorStore`, texts and metadata live in a
+    side store keyed by the int64 FAISS ids and saved next to the index as
+    `<index_path>.docs.json`.
+
+    The index type is a FAISS factory string ("Flat", "HNSW32", "IVF1024,Flat",
+    "IVF1024,PQ48", "SQ8", ...). Index types that need training buffer added
+    vectors (searched brute-force) until `train_size` are available, then
+    train on them. With `use_mmap` a saved index is memory-mapped read-only
+    and only fully loaded on the first write.
+
+    With `use_wal`, every add/delete/reset is appended to a write-ahead log
+    before it is applied. A background thread snapshots the index every
+    `snapshot_interval` seconds and startup replays the log on top of the
+    latest snapshot, so nothing is lost between snapshots.
+    """
+
+    def __init__(
+        self,
+        vector_dim=384,
+        index_path="faiss.index",
+        metric="l2",
+        embedder=None,
+        index_factory=Config.FAISS_INDEX_FACTORY,
+        ef_search=Config.FAISS_EF_SEARCH,
+        nprobe=Config.FAISS_NPROBE,
+        train_size=Config.FAISS_TRAIN_SIZE,
+        use_mmap=Config.FAISS_MMAP,
+        use_wal=Config.FAISS_WAL,
+        wal_fsync=Config.FAISS_WAL_FSYNC,
+        snapshot_interval=Config.FAISS_SNAPSHOT_INTERVAL,
+        compact_ratio=Config.FAISS_COMPACT_RATIO,
+    ):
         self.vector_dim = vector_dim
         self.index_path = index_path
+        self.metric = metric  # "l2", or "ip" for inner product (cosine on normalized vectors)
+        self.embedder = embedder
+        self.index_factory = index_factory
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.use_mmap = use_mmap
+        self.use_wal = use_wal and index_path is not None
+        self.wal_fsync = wal_fsync
+        self.snapshot_interval = snapshot_interval
+        self.compact_ratio = compact_ratio
         self.index = None
+        self.wal = None
+        self._index_file = index_path
+        self._ops_since_snapshot = 0
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_thread = None
+        self._stop_snapshots = threading.Event()
+
+        # Vectors added before the index is trained
+        self._pending_vectors = np.empty((0, vector_dim), dtype=np.float32)
+        self._pending_ids = np.empty((0,), dtype=np.int64)
+        # Ids deleted from indexes that can't remove vectors (HNSW)
+        self._tombstones = set()
+        self._mmapped = False
+
+        # Side store: FAISS id -> {"id", "content", "metadata"}, and doc id -> FAISS id
+        self.docs = {}
+        self.doc_ids = {}
+        # FAISS ids of `docs` in ascending order, for paging
+        self._sorted_ids = []
+        self._next_id = 0
+        self._lock = threading.RLock()
+
+    def _new_index(self):
+        metric = faiss.METRIC_INNER_PRODUCT if self.metric == "ip" else faiss.METRIC_L2
+        # IVF indexes store ids natively (and IDMap's remove_ids would misalign
+        # them); the others are wrapped with IDMap to support .add_with_ids
+        factory = self.index_factory if "IVF" in self.index_factory else f"IDMap,{self.index_factory}"
+        index = faiss.index_factory(self.vector_dim, factory, metric)
+        self._apply_search_params(index)
+        return index
+
+    def _apply_search_params(self, index):
+        params = []
+        if "HNSW" in self.index_factory:
+            params.append(f"efSearch={self.ef_search}")
+        if "IVF" in self.index_factory:
+            params.append(f"nprobe={self.nprobe}")
+        if params:
+            faiss.ParameterSpace().set_index_parameters(index, ",".join(params))
 
     def load_or_create_index(self):
-        if os.path.exists(self.index_path):
-            logger.info(f"Loading FAISS index from {self.index_path}...")
-            self.index  = faiss.read_index(self.index_path)
+        manifest = self._read_manifest()
+        self._index_file = self._snapshot_path(manifest["index_file"]) if manifest and "index_file" in manifest else self.index_path
+        if os.path.exists(self._index_file):
+            logger.info(f"Loading FAISS index from {self._index_file} (mmap={self.use_mmap})...")
+            if self.use_mmap:
+                self.index = faiss.read_index(self._index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            else:
+                self.index = faiss.read_index(self._index_file)
+            self._mmapped = self.use_mmap
+            self._apply_search_params(self.index)
             count = self.index.ntotal
             logger.info(f"Loaded FAISS index with {count} vectors.")
+            if manifest:
+                self._load_docs(manifest)
         else:
             logger.info("No FAISS index found, creating a new one...")
-            flat_index = faiss.IndexFlatL2(self.vector_dim)
-            self.index = faiss.IndexIDMap(flat_index)
-            logger.info("New FAISS index created at {self.index_path}.")
+            self.index = self._new_index()
+            logger.info(f"New FAISS index created at {self.index_path} ({self.index_factory}).")
+
+        if self.use_wal:
+            self._replay_wal(manifest.get("wal_segment", 0) if manifest else 0)
+
+    def _ensure_writable(self):
+        # A memory-mapped index is read-only; load it fully before the first write
+        if self._mmapped:
+            logger.info(f"Loading FAISS index from {self._index_file} into memory for writing...")
+            self.index = faiss.read_index(self._index_file)
+            self._apply_search_params(self.index)
+            self._mmapped = False
 
-    def save_index(self,index):
+    def save_index(self, index=None):
+        """
+        Write a full snapshot of the index and side store.
+        """
         if self.index is not None:
-            logger.info(f"Saving FAISS index to {self.index_path}...")
-            faiss.write_index(index, self.index_path)
-            count = index.ntotal
-            logger.info(f"Saved FAISS index with {count} vectors.")
+            self.snapshot(force=True)
+
+    def snapshot(self, force: bool = False):
+        """
+        Persist the index and side store, then drop the WAL segments they
+        cover. Only cloning the index and copying the state happens under the
+        lock; serializing and writing the files happens while adds, deletes
+        and searches keep going (new writes go to the new WAL segment).
+        """
+        with self._snapshot_lock:
+            with self._lock:
+                if not force and self._ops_since_snapshot == 0:
+                    return
+                logger.info(f"Snapshotting FAISS index ({self._ops_since_snapshot} operations since the last one)...")
+                index_copy = faiss.clone_index(self.index)
+                state = {
+                    "next_id": self._next_id,
+                    "docs": dict(self.docs),
+                    "tombstones": sorted(self._tombstones),
+                    "pending_ids": self._pending_ids.tolist(),
+                }
+                pending_vectors = self._pending_vectors.copy()
+                segment = self.wal.rotate() if self.wal is not None else 0
+                self._ops_since_snapshot = 0
+
+            # Versioned files + a manifest renamed into place last: a crash at
+            # any point leaves the previous snapshot and its WAL segments intact
+            version = f"{segment:08d}"
+            index_file = f"{os.path.basename(self.index_path)}.{version}"
+            tmp_path = f"{self._snapshot_path(index_file)}.tmp"
+            faiss.write_index(index_copy, tmp_path)
+            del index_copy
+            with open(tmp_path, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._snapshot_path(index_file))
+            if state["pending_ids"]:
+                state["pending_file"] = f"{index_file}.pending.npy"
+                np.save(self._snapshot_path(state["pending_file"]), pending_vectors)
+            state["index_file"] = index_file
+            state["wal_segment"] = segment
+
+            tmp_path = f"{self._docs_path()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._docs_path())
+
+            previous = self._index_file
+            self._index_file = self._snapshot_path(index_file)
+            if self.wal is not None:
+                self.wal.drop_before(segment)
+            self._remove_old_snapshots(keep=index_file)
+            if previous != self._index_file and previous != self.index_path and os.path.exists(previous):
+                os.remove(previous)
+            logger.info(f"Saved FAISS snapshot {index_file} with {len(state['docs'])} documents.")
+
+    def _snapshot_path(self, name: str) -> str:
+        return os.path.join(os.path.dirname(self.index_path), name)
+
+    def _remove_old_snapshots(self, keep: str):
+        prefix = f"{os.path.basename(self.index_path)}."
+        directory = os.path.dirname(self.index_path) or "."
+        for name in os.listdir(directory):
+            if not name.startswith(prefix) or name.startswith(keep):
+                continue
+            version = name[len(prefix):].split(".", 1)[0]
+            if version.isdigit() and len(version) == 8:
+                os.remove(os.path.join(directory, name))
+
+    def _docs_path(self):
+        return f"{self.index_path}.docs.json"
+
+    def _read_manifest(self) -> Optional[dict]:
+        if not os.path.exists(self._docs_path()):
+            return None
+        with open(self._docs_path(), "r") as f:
+            return json.load(f)
+
+    def _load_docs(self, data: dict):
+        self.docs = {int(faiss_id): doc for faiss_id, doc in data["docs"].items()}
+        self.doc_ids = {doc["id"]: faiss_id for faiss_id, doc in self.docs.items()}
+        self._sorted_ids = sorted(self.docs)
+        self._next_id = data["next_id"]
+        self._tombstones = set(data.get("tombstones", []))
+        if data.get("pending_ids"):
+            self._pending_ids = np.array(data["pending_ids"], dtype=np.int64)
+            pending_file = data.get("pending_file", f"{os.path.basename(self.index_path)}.pending.npy")
+            self._pending_vectors = np.load(self._snapshot_path(pending_file))
+        logger.info(f"Loaded {len(self.docs)} documents from {self._docs_path()}.")
+
+    # --- Write-ahead log ---
+
+    def _replay_wal(self, from_segment: int):
+        self.wal = WriteAheadLog(self.index_path, fsync=self.wal_fsync)
+        replayed = 0
+        for header, payload in self.wal.replay(from_segment):
+            vectors = np.frombuffer(payload, dtype=np.float32).reshape(-1, self.vector_dim) if payload else None
+            self._apply(header, vectors)
+            replayed += 1
+        segments = self.wal.segments()
+        self.wal.open(max([from_segment] + [number + 1 for number, _ in segments]))
+        self._ops_since_snapshot = replayed
+        if replayed:
+            logger.info(f"Replayed {replayed} FAISS operations from the write-ahead log.")
+
+    def _log(self, header: dict, vectors: Optional[np.ndarray] = None):
+        if self.wal is not None:
+            self.wal.append(header, vectors.tobytes() if vectors is not None else b"")
+        self._ops_since_snapshot += 1
+
+    def _apply(self, op: dict, vectors: Optional[np.ndarray]):
+        if op["op"] == "add":
+            replaced = op.get("replaced", [])
+            if replaced:
+                self.remove_ids(np.array(replaced, dtype=np.int64))
+                for faiss_id in replaced:
+                    self._forget(faiss_id)
+            faiss_ids = np.array(op["ids"], dtype=np.int64)
+            self.add_embeddings(vectors, faiss_ids)
+            for faiss_id, doc in zip(op["ids"], op["docs"]):
+                self.docs[faiss_id] = doc
+                self.doc_ids[doc["id"]] = faiss_id
+            # New ids are always above every existing one
+            self._sorted_ids.extend(op["ids"])
+            self._next_id = max(self._next_id, max(op["ids"], default=-1) + 1)
+        elif op["op"] == "delete":
+            self.remove_ids(np.array(op["ids"], dtype=np.int64))
+            for faiss_id in op["ids"]:
+                doc = self._forget(faiss_id)
+                if doc is not None:
+                    self.doc_ids.pop(doc["id"], None)
+        elif op["op"] == "reset":
+            self.reset_index()
+            self.docs = {}
+            self.doc_ids = {}
+            self._sorted_ids = []
+            self._next_id = 0
+
+    def _forget(self, faiss_id: int) -> Optional[dict]:
+        doc = self.docs.pop(faiss_id, None)
+        if doc is not None:
+            position = bisect.bisect_left(self._sorted_ids, faiss_id)
+            if position < len(self._sorted_ids) and self._sorted_ids[position] == faiss_id:
+                del self._sorted_ids[position]
+        return doc
+
+    def _snapshot_loop(self):
+        while not self._stop_snapshots.wait(self.snapshot_interval):
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.error(f"FAISS snapshot failed: {e}")
+
+    def train(self, sample: np.ndarray):
+        """
+        Train the index on a sample of vectors (at most `train_size` rows are used).
+        """
+        assert self.index is not None, "Index not initialized"
+        sample = np.asarray(sample, dtype=np.float32)
+        if len(sample) > self.train_size:
+            rows = np.random.default_rng(0).choice(len(sample), self.train_size, replace=False)
+            sample = sample[rows]
+        logger.info(f"Training FAISS index ({self.index_factory}) on {len(sample)} vectors...")
+        self._ensure_writable()
+        self.index.train(sample)
 
     def add_embeddings(self, embeddings: np.ndarray, ids: np.ndarray):
         assert self.index is not None, "Index not initialized"
+        self._ensure_writable()
+        if not self.index.is_trained:
+            self._pending_vectors = np.vstack([self._pending_vectors, embeddings])
+            self._pending_ids = np.concatenate([self._pending_ids, np.asarray(ids, dtype=np.int64)])
+            if len(self._pending_ids) < self.train_size:
+                logger.debug(f"Buffered {len(ids)} vectors until the index can be trained ({len(self._pending_ids)}/{self.train_size}).")
+                return
+            self.train(self._pending_vectors)
+            embeddings, ids = self._pending_vectors, self._pending_ids
+            self._pending_vectors = np.empty((0, self.vector_dim), dtype=np.float32)
+            self._pending_ids = np.empty((0,), dtype=np.int64)
         self.index.add_with_ids(embeddings, ids)
         logger.debug(f"Added {len(ids)} vectors to FAISS.")
 
-    def search(self, query_vector: np.ndarray, k: int = 5):
+    def remove_ids(self, ids: np.ndarray):
         assert self.index is not None, "Index not initialized"
-        return self.index.search(query_vector, k)
+        ids = np.asarray(ids, dtype=np.int64)
+        self._ensure_writable()
+        if len(self._pending_ids):
+            keep = ~np.isin(self._pending_ids, ids)
+            self._pending_vectors, self._pending_ids = self._pending_vectors[keep], self._pending_ids[keep]
+        try:
+            removed = self.index.remove_ids(ids)
+        except RuntimeError:
+            # HNSW graphs can't drop vectors; filter them out of search results instead
+            self._tombstones.update(ids.tolist())
+            removed = len(ids)
+            if len(self._tombstones) > self.compact_ratio * self.index.ntotal:
+                self._compact()
+        logger.debug(f"Removed {removed} vectors from FAISS.")
+        return removed
+
+    def _compact(self):
+        """
+        Rebuild an index that can't remove vectors from its live vectors, so
+        searches stop over-fetching for the tombstoned ones.
+        """
+        ids = faiss.vector_to_array(self.index.id_map)
+        vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        keep = ~np.isin(ids, list(self._tombstones))
+        logger.info(f"Compacting FAISS index: dropping {len(ids) - int(keep.sum())} deleted vectors, keeping {int(keep.sum())}...")
+        self.index = self._new_index()
+        if keep.any():
+            if not self.index.is_trained:
+                self.index.train(vectors[keep])
+            self.index.add_with_ids(vectors[keep], ids[keep])
+        self._tombstones = set()
+
+    def search_vectors(self, query_vector: np.ndarray, k: int = 5):
+        assert self.index is not None, "Index not initialized"
+        if self.index.ntotal == 0:
+            distances = np.empty((len(query_vector), 0), dtype=np.float32)
+            ids = np.empty((len(query_vector), 0), dtype=np.int64)
+        else:
+            # Over-fetch to make up for tombstoned vectors
+            fetch = min(k + len(self._tombstones), self.index.ntotal)
+            distances, ids = self.index.search(query_vector, fetch)
+        if self._tombstones:
+            distances, ids = self._drop_tombstones(distances, ids)
+        if len(self._pending_ids):
+            distances, ids = self._merge_pending(query_vector, distances, ids)
+        return distances[:, :k], ids[:, :k]
+
+    def _drop_tombstones(self, distances, ids):
+        mask = np.isin(ids, list(self._tombstones))
+        ids = np.where(mask, -1, ids)
+        distances = np.where(mask, -np.inf if self.metric == "ip" else np.inf, distances)
+        order = np.argsort(-distances if self.metric == "ip" else distances, axis=1, kind="stable")
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    def _merge_pending(self, query_vector, distances, ids):
+        # Brute-force the vectors that are waiting for the index to be trained
+        if self.metric == "ip":
+            pending = query_vector @ self._pending_vectors.T
+        else:
+            pending = ((query_vector[:, None, :] - self._pending_vectors[None, :, :]) ** 2).sum(axis=2)
+        distances = np.hstack([distances, pending.astype(np.float32)])
+        ids = np.hstack([ids, np.broadcast_to(self._pending_ids, pending.shape)])
+        order = np.argsort(-distances if self.metric == "ip" else distances, axis=1, kind="stable")
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(ids, order, axis=1)
 
     def reset_index(self):
         logger.info("Resetting FAISS index...")
-        flat_index = faiss.IndexFlatL2(self.vector_dim)
-        self.index = faiss.IndexIDMap(flat_index)
+        self.index = self._new_index()
+        self._mmapped = False
+        self._pending_vectors = np.empty((0, self.vector_dim), dtype=np.float32)
+        self._pending_ids = np.empty((0,), dtype=np.int64)
+        self._tombstones = set()
         logger.info("FAISS index reset.")
 
     def get_index(self):
         if os.path.exists(self.index_path):
             return faiss.read_index(self.index_path)
         else:
-            # Use IndexFlatL2 for L2 distance + wrap with IndexIDMap to support .add_with_ids
-            base_index = faiss.IndexFlatL2(self.vector_dim)
-            return faiss.IndexIDMap(base_index)
+            return self._new_index()
+
+    # --- VectorStore ---
+
+    def connect(self):
+        self.load_or_create_index()
+        if self.use_wal and self.snapshot_interval > 0:
+            self._stop_snapshots.clear()
+            self._snapshot_thread = threading.Thread(target=self._snapshot_loop, name="faiss-snapshot", daemon=True)
+            self._snapshot_thread.start()
+
+    def disconnect(self):
+        if self._snapshot_thread is not None:
+            self._stop_snapshots.set()
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+        if self.wal is not None:
+            # Everything since the last snapshot is already in the log
+            self.wal.close()
+        else:
+            self.save_index()
+
+    def health(self) -> dict:
+        if self.index is None:
+            return {"status": "red", "backend": "faiss"}
+        return {
+            "status": "green" if self.index.is_trained else "yellow",
+            "backend": "faiss",
+            "index_factory": self.index_factory,
+            "vectors": self.index.ntotal,
+            "pending_training": len(self._pending_ids),
+            "mmapped": self._mmapped,
+        }
+
+    def add(self, texts, ids, embeddings=None, metadatas=None, chunk_size=None, refresh=True) -> dict:
+        check_add_lengths(texts, ids, embeddings, metadatas)
+        if embeddings is None:
+            embeddings = self.embedder.encode(texts)
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), self.vector_dim)
+        metadatas = metadatas if metadatas is not None else [None] * len(texts)
+        with self._lock:
+            op = {
+                "op": "add",
+                "ids": list(range(self._next_id, self._next_id + len(texts))),
+                # Same id overwrites, as with OpenSearch's index operation
+                "replaced": [self.doc_ids[doc_id] for doc_id in ids if doc_id in self.doc_ids],
+                "docs": [{"id": doc_id, "content": text, "metadata": metadata or {}} for doc_id, text, metadata in zip(ids, texts, metadatas)],
+            }
+            self._log(op, vectors)
+            self._apply(op, vectors)
+        return {"indexed": len(texts), "errors": []}
+
+    def search(self, query: Union[str, np.ndarray], k: int = 3) -> List[dict]:
+        if isinstance(query, str):
+            query = self.embedder.encode(query)
+        query_vector = np.asarray(query, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            if self.index.ntotal == 0 and len(self._pending_ids) == 0:
+                return []
+            scores, faiss_ids = self.search_vectors(query_vector, k)
+            results = []
+            for score, faiss_id in zip(scores[0].tolist(), faiss_ids[0].tolist()):
+                doc = self.docs.get(faiss_id)
+                if faiss_id < 0 or doc is None:
+                    continue
+                # Match OpenSearch's l2 scoring so scores are comparable across backends
+                score = score if self.metric == "ip" else 1.0 / (1.0 + score)
+                results.append(self._to_doc(doc, score))
+        return results
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        with self._lock:
+            faiss_id = self.doc_ids.get(doc_id)
+            return self._to_doc(self.docs[faiss_id]) if faiss_id is not None else None
+
+    def delete(self, doc_id: str) -> bool:
+        with self._lock:
+            faiss_id = self.doc_ids.get(doc_id)
+            if faiss_id is None:
+                return False
+            op = {"op": "delete", "ids": [faiss_id]}
+            self._log(op)
+            self._apply(op, None)
+            return True
+
+    def get_many(self, doc_ids: List[str]) -> List[Optional[dict]]:
+        with self._lock:
+            return [self.get(doc_id) for doc_id in doc_ids]
+
+    def exists_many(self, doc_ids: List[str]) -> List[bool]:
+        with self._lock:
+            return [doc_id in self.doc_ids for doc_id in doc_ids]
+
+    def delete_many(self, doc_ids: List[str], refresh: bool = True) -> dict:
+        result = {"deleted": [], "not_found": []}
+        with self._lock:
+            faiss_ids = []
+            for doc_id in dict.fromkeys(doc_ids):
+                faiss_id = self.doc_ids.get(doc_id)
+                if faiss_id is None:
+                    result["not_found"].append(doc_id)
+                else:
+                    faiss_ids.append(faiss_id)
+                    result["deleted"].append(doc_id)
+            if faiss_ids:
+                # One WAL record and one remove_ids call for the whole batch
+                op = {"op": "delete", "ids": faiss_ids}
+                self._log(op)
+                self._apply(op, None)
+        return result
+
+    def reset(self):
+        with self._lock:
+            op = {"op": "reset"}
+            self._log(op)
+            self._apply(op, None)
+
+    def count(self) -> int:
+        return len(self.docs)
+
+    def list(self, limit: int = 100) -> List[dict]:
+        with self._lock:
+            return [self._to_doc(doc) for _, doc in zip(range(limit), self.docs.values())]
+
+    def list_page(self, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        # FAISS ids only grow, so they give a stable order that survives deletes
+        after = decode_cursor(cursor, after=int)["after"] if cursor is not None else -1
+        with self._lock:
+            start = bisect.bisect_right(self._sorted_ids, after)
+            faiss_ids = self._sorted_ids[start:start + limit + 1]
+            docs = [self._to_doc(self.docs[faiss_id]) for faiss_id in faiss_ids[:limit]]
+        if len(faiss_ids) <= limit:
+            return docs, None
+        return docs, encode_cursor({"after": faiss_ids[limit - 1]})
+
+    @staticmethod
+    def _to_doc(doc: dict, score: Optional[float] = None) -> dict:
+        result = {"id": doc["id"], "text": doc["content"], "metadata": doc["metadata"]}
+        if score is not None:
+            result["score"] = score
+        return result
@@ -0,0 +1,294 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+from uuid import uuid4
+
+import numpy as np
+import embedding_worker
+import metrics
+from config import Config
+from external_services.chunker import chunk_id
+from external_services.vector_store import check_add_lengths, content_id
+
+
+logger = logging.getLogger(__name__)
+
+MAX_JOB_ERRORS = 100
+
+def plan_ingest(store, chunker, texts: List[str], metadatas: Optional[List[dict]], chunking: bool, dedup: bool) -> dict:
+    """
+    Assign ids and split `texts` into the items to embed and index. With
+    `dedup`, ids are content hashes and texts already stored (whole or
+    chunked) or repeated in the batch are dropped with one bulk existence
+    check, before anything is embedded.
+    """
+    check_add_lengths(texts, None, metadatas=metadatas)
+    metadatas = metadatas or [None] * len(texts)
+    ids = [content_id(text) if dedup else str(uuid4()) for text in texts]
+
+    existing = set()
+    if dedup:
+        unique = list(dict.fromkeys(ids))
+        found = store.exists_many(unique + [chunk_id(doc_id, 0) for doc_id in unique])
+        existing = {doc_id for doc_id, whole, chunked in zip(unique, found, found[len(unique):]) if whole or chunked}
+
+    new = {}
+    seen = set()
+    duplicates = []
+    for position, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+        if doc_id in seen:
+            duplicates.append(position)
+            continue
+        seen.add(doc_id)
+        if doc_id not in existing:
+            new[doc_id] = (text, metadata)
+
+    if chunking:
+        items = [c for doc_id, (text, metadata) in new.items() for c in chunker.chunk(doc_id, text, metadata)]
+    else:
+        items = [{"id": doc_id, "text": text, "metadata": metadata} for doc_id, (text, metadata) in new.items()]
+
+    return {
+        "ids": ids,
+        "documents": len(new),
+        "skipped": [doc_id for doc_id in dict.fromkeys(ids) if doc_id in existing],
+        # Positions of texts repeating an earlier one in the batch: documents + skipped + duplicates = texts
+        "duplicates": duplicates,
+        "items": items,
+        "has_metadata": chunking or any(metadatas),
+    }
+
+
+class IngestionJob:
+    __slots__ = (
+        "id", "status", "cancel_event", "created_at", "started_at", "finished_at",
+        "documents", "chunks", "skipped", "duplicates", "embedded", "indexed", "errors", "error_count", "ids",
+    )
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"  # queued | running | done | failed | cancelled
+        self.cancel_event = threading.Event()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.documents = 0
+        self.chunks = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.embedded = 0
+        self.indexed = 0
+        self.errors = []
+        self.error_count = 0
+        self.ids = []
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "documents": self.documents,
+            "skipped": self.skipped,
+            "duplicates": self.duplicates,
+            "chunks": self.chunks,
+            "embedded": self.embedded,
+            "indexed": self.indexed,
+            "progress": self.indexed / self.chunks if self.chunks else (1.0 if self.status == "done" else 0.0),
+            "elapsed_seconds": round(elapsed, 3),
+            "chunks_per_second": round(self.indexed / elapsed, 2) if elapsed > 0 else 0.0,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "ids": self.ids,
+        }
+
+
+class IngestionQueueFull(Exception):
+    """
+    Too many jobs are waiting to run; each one holds its texts until it starts.
+    """
+
+
+class IngestionManager:
+    """
+    Background ingestion jobs.
+
+    Jobs run one at a time on a runner thread. Embedding is spread over a
+    pool of worker processes (one per core by default, each limited to one
+    torch thread and lowered in priority), and every embedded batch is
+    bulk-indexed while the pool works on the next ones, with up to two
+    batches per worker in flight. Cached embeddings are reused and new ones
+    are added to the embedder's cache.
+    """
+
+    def __init__(
+        self,
+        store,
+        chunker,
+        embedder,
+        workers: int = Config.INGEST_WORKERS,
+        batch_size: int = Config.INGEST_BATCH_SIZE,
+        max_jobs: int = Config.INGEST_MAX_JOBS,
+        max_queued: int = Config.INGEST_MAX_QUEUED,
+    ):
+        self.store = store
+        self.chunker = chunker
+        self.embedder = embedder
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.max_jobs = max_jobs
+        self.max_queued = max_queued
+
+        self.jobs = OrderedDict()  # job id -> IngestionJob, oldest first
+        self._pool = None
+        self._runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingestion")
+        self._lock = threading.Lock()
+
+    def submit(self, texts: List[str], metadatas=None, chunking=True, dedup=True, chunk_size=None, refresh=True, on_done=None) -> dict:
+        job = IngestionJob()
+        with self._lock:
+            queued = sum(1 for queued_job in self.jobs.values() if queued_job.status == "queued")
+            if queued >= self.max_queued:
+                raise IngestionQueueFull(f"{queued} ingestion jobs are already waiting, try again later")
+            self.jobs[job.id] = job
+            self._evict()
+        self._runner.submit(self._run, job, texts, metadatas, chunking, dedup, chunk_size, refresh, on_done)
+        return job.to_dict()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+        return job.to_dict() if job is not None else None
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return [{k: v for k, v in job.to_dict().items() if k not in ("errors", "ids")} for job in reversed(jobs)]
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """
+        Stop a queued or running job after the batch in progress. Documents
+        indexed before that stay in the index.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job.cancel_event.set()
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished_at = time.time()
+        return job.to_dict()
+
+    def stop(self):
+        with self._lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            job.cancel_event.set()
+        self._runner.shutdown(wait=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in ("done", "failed", "cancelled")]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[job_id]
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            logger.info(f"Starting {self.workers} embedding worker processes...")
+            # spawn: forking a process that runs torch and other threads is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=embedding_worker.init_worker,
+                initargs=(self.embedder.model_name, self.embedder.backend, self.embedder.onnx_file, 1, Config.INGEST_WORKER_NICENESS),
+            )
+        return self._pool
+
+    def _run(self, job: IngestionJob, texts, metadatas, chunking, dedup, chunk_size, refresh, on_done):
+        with self._lock:
+            if job.cancel_event.is_set():
+                return
+            job.status = "running"
+        job.started_at = time.time()
+        try:
+            plan = plan_ingest(self.store, self.chunker, texts, metadatas, chunking, dedup)
+            job.ids = plan["ids"]
+            job.documents = plan["documents"]
+            job.skipped = len(plan["skipped"])
+            job.duplicates = len(plan["duplicates"])
+            job.chunks = len(plan["items"])
+            self._pipeline(job, plan["items"], plan["has_metadata"], chunk_size, refresh)
+            job.status = "cancelled" if job.cancel_event.is_set() else "done"
+        except Exception as e:
+            metrics.ERRORS.labels("ingestion").inc()
+            logger.error(f"Ingestion job {job.id} failed: {e}")
+            if isinstance(e, BrokenProcessPool):
+                # Start a fresh pool for the next job
+                self._pool = None
+            job.status = "failed"
+            self._record_errors(job, [{"error": str(e)}])
+        finally:
+            job.finished_at = time.time()
+            logger.info(f"Ingestion job {job.id} {job.status}: {job.indexed}/{job.chunks} chunks in {job.finished_at - job.started_at:.1f}s.")
+            if on_done is not None and job.indexed:
+                on_done()
+
+    def _pipeline(self, job: IngestionJob, items: List[dict], has_metadata: bool, chunk_size, refresh: bool):
+        batches = [items[start:start + self.batch_size] for start in range(0, len(items), self.batch_size)]
+        in_flight = deque()
+        next_batch = 0
+        while next_batch < len(batches) or in_flight:
+            # Keep the pool busy while the current batch is being indexed
+            while next_batch < len(batches) and len(in_flight) < 2 * self.workers and not job.cancel_event.is_set():
+                in_flight.append(self._embed_async(batches[next_batch]))
+                next_batch += 1
+            if job.cancel_event.is_set():
+                for *_, future in in_flight:
+                    if future is not None:
+                        future.cancel()
+                if refresh and job.indexed:
+                    # The batches indexed so far skipped the refresh
+                    self.store.refresh()
+                return
+
+            batch, cached, missing, future = in_flight.popleft()
+            if future is not None:
+                self.embedder.store_encoded(cached, missing, [batch[i]["text"] for i in missing], future.result())
+            vectors = np.stack(cached)
+            job.embedded += len(batch)
+            last = next_batch == len(batches) and not in_flight
+            result = self.store.add(
+                [item["text"] for item in batch],
+                ids=[item["id"] for item in batch],
+                embeddings=vectors,
+                metadatas=[item["metadata"] for item in batch] if has_metadata else None,
+                chunk_size=chunk_size,
+                refresh=refresh and last,
+            )
+            job.indexed += result["indexed"]
+            self._record_errors(job, result["errors"])
+
+    def _embed_async(self, batch: List[dict]):
+        texts = [item["text"] for item in batch]
+        cached, missing = self.embedder.lookup_cached(texts)
+        future = None
+        if missing:
+            future = self._get_pool().submit(embedding_worker.embed, [texts[i] for i in missing], self.embedder.max_batch_size)
+        return batch, cached, missing, future
+
+    @staticmethod
+    def _record_errors(job: IngestionJob, errors: List[dict]):
+        job.error_count += len(errors)
+        room = MAX_JOB_ERRORS - len(job.errors)
+        if room > 0:
+            job.errors.extend(errors[:room])
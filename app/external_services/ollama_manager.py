@@ -0,0 +1,369 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import AsyncIterator, List, Optional
+
+import httpx
+import metrics
+import profiling
+from config import Config
+
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaUnavailable(Exception):
+    """
+    No backend can take the chat: the wait queue is full (429), the wait
+    timed out or every backend is ejected (503).
+    """
+
+    def __init__(self, detail: str, status_code: int = 503, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class OllamaBackend:
+    def __init__(self, url: str, max_concurrency: int):
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.client = None
+        self.in_flight = 0
+        self.healthy = True
+        self.failures = 0  # consecutive failed chats
+        self.requests = 0
+        self.probe_at = None  # monotonic time an ejected backend is probed again, without the health loop
+
+    def has_capacity(self) -> bool:
+        return self.healthy and self.in_flight < self.max_concurrency
+
+    def status(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "consecutive_failures": self.failures,
+            "requests": self.requests,
+        }
+
+
+class OllamaLease:
+    """
+    A reserved slot on one backend. `release` is idempotent so a streaming
+    response can release it both when the stream ends and as a background
+    task, in case the stream is never started.
+    """
+
+    def __init__(self, manager: "OllamaManager", backend: OllamaBackend):
+        self.manager = manager
+        self.backend = backend
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.manager._release(self.backend)
+
+
+class OllamaManager:
+    """
+    Pool of Ollama backends serving the same model. Each chat goes to the
+    healthy backend with the fewest requests in flight, up to
+    `max_concurrency` per backend; beyond that chats wait in a bounded FIFO
+    queue. Every backend has a long-lived `httpx.AsyncClient` with its own
+    keep-alive connections.
+
+    A backend is ejected when its health check fails or after `max_failures`
+    consecutive failed chats, and rejoins once a health check passes. With
+    the health loop disabled (`health_interval` 0), an ejected backend is
+    checked on the next `acquire` after `eject_cooldown` seconds instead.
+    """
+
+    def __init__(
+        self,
+        urls: List[str] = Config.OLLAMA_URLS,
+        model: str = Config.OLLAMA_MODEL,
+        max_concurrency: int = Config.OLLAMA_MAX_CONCURRENCY,
+        queue_size: int = Config.OLLAMA_QUEUE_SIZE,
+        queue_timeout: float = Config.OLLAMA_QUEUE_TIMEOUT,
+        health_interval: float = Config.OLLAMA_HEALTH_INTERVAL,
+        health_timeout: float = Config.OLLAMA_HEALTH_TIMEOUT,
+        max_failures: int = Config.OLLAMA_MAX_FAILURES,
+        eject_cooldown: float = Config.OLLAMA_EJECT_COOLDOWN,
+        max_connections: int = Config.OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections: int = Config.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = Config.OLLAMA_KEEPALIVE_EXPIRY,
+        connect_timeout: float = Config.OLLAMA_CONNECT_TIMEOUT,
+        read_timeout: float = Config.OLLAMA_READ_TIMEOUT,
+    ):
+        self.backends = [OllamaBackend(url, max_concurrency) for url in urls]
+        self.model = model
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.max_failures = max_failures
+        self.eject_cooldown = eject_cooldown
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        self.rejected = 0
+        self._waiters = deque()
+        self._health_task = None
+
+    async def connect(self):
+        for backend in self.backends:
+            logger.info(f"Creating Ollama client for {backend.url} (max_concurrency={backend.max_concurrency})...")
+            backend.client = httpx.AsyncClient(
+                base_url=backend.url,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            )
+            metrics.OLLAMA_BACKEND_HEALTHY.labels(backend.url).set(1)
+            metrics.OLLAMA_BACKEND_IN_FLIGHT.labels(backend.url).set(0)
+        if self.health_interval > 0:
+            await self.check_health()
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def disconnect(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for backend in self.backends:
+            if backend.client is not None:
+                logger.info(f"Closing Ollama client for {backend.url}.")
+                await backend.client.aclose()
+                backend.client = None
+
+    async def acquire(self) -> OllamaLease:
+        """
+        Reserve a slot on the least loaded healthy backend, waiting in the
+        queue for up to `queue_timeout` if all of them are at capacity.
+        """
+        if self._health_task is None:
+            await self._probe_ejected()
+        if not any(backend.healthy for backend in self.backends):
+            raise self._reject("No healthy Ollama backend", 503, "unavailable")
+        backend = None if self._waiters else self._pick()
+        if backend is not None:
+            return self._lease(backend)
+        if len(self._waiters) >= self.queue_size:
+            raise self._reject("Too many chats waiting for the model, try again shortly", 429, "queue_full", retry_after=1)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        metrics.OLLAMA_QUEUE_DEPTH.set(len(self._waiters))
+        start = time.perf_counter()
+        try:
+            with profiling.span("ollama_queue"):
+                backend = await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                # Handed a slot just as the wait ended
+                self._release(waiter.result())
+            else:
+                waiter.cancel()
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            metrics.OLLAMA_QUEUE_DEPTH.set(len(self._waiters))
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject(f"No Ollama backend free within {self.queue_timeout:g}s", 503, "queue_timeout", retry_after=1)
+            raise
+        finally:
+            metrics.OLLAMA_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - start)
+        return OllamaLease(self, backend)
+
+    async def stream_chat(self, messages: List[dict], lease: Optional[OllamaLease] = None) -> AsyncIterator[dict]:
+        """
+        Yield each decoded NDJSON message from a streaming `/api/chat` call,
+        up to and including the final `done` message. Uses `lease` if given
+        (and releases it), otherwise reserves a backend first. A backend that
+        refuses the connection is marked as failed and the chat moves to
+        another one. Records time to first token and the timings Ollama
+        reports when it is done.
+        """
+        lease = lease or await self.acquire()
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": True
+        }
+        attempts = 1
+        try:
+            while True:
+                backend = lease.backend
+                assert backend.client is not None, "Ollama client not initialized"
+                start = time.perf_counter()
+                first_token = None
+                try:
+                    async with backend.client.stream("POST", "/api/chat", json=payload) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            try:
+                                data = json.loads(line)
+                            except json.JSONDecodeError:
+                                logger.warning(f"Could not decode JSON line from Ollama: {line}")
+                                continue
+                            if first_token is None and data.get("message", {}).get("content"):
+                                first_token = time.perf_counter()
+                                metrics.LLM_TTFT_SECONDS.observe(first_token - start)
+                                profiling.add_span("time_to_first_token", start, first_token)
+                            if data.get("done", False):
+                                metrics.record_ollama_done(data)
+                                profiling.add_span("generation", first_token or start, time.perf_counter())
+                            yield data
+                            if data.get("done", False):
+                                break
+                    self._succeeded(backend)
+                    return
+                except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                    # Nothing was sent, so another backend can take the chat
+                    self._failed(backend, e)
+                    if attempts >= len(self.backends):
+                        raise
+                    lease.release()
+                    lease = await self.acquire()
+                    attempts += 1
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code >= 500:
+                        self._failed(backend, e)
+                    raise
+                except httpx.TransportError as e:
+                    self._failed(backend, e)
+                    raise
+        except Exception:
+            metrics.ERRORS.labels("ollama").inc()
+            raise
+        finally:
+            lease.release()
+
+    async def chat(self, messages: List[dict], lease: Optional[OllamaLease] = None) -> str:
+        collected_text = ""
+        async for data in self.stream_chat(messages, lease=lease):
+            if "message" in data and "content" in data["message"]:
+                collected_text += data["message"]["content"]
+        return collected_text
+
+    async def check_health(self):
+        await asyncio.gather(*(self._check(backend) for backend in self.backends))
+
+    def status(self) -> dict:
+        return {
+            "model": self.model,
+            "queued": len(self._waiters),
+            "queue_size": self.queue_size,
+            "rejected": self.rejected,
+            "backends": [backend.status() for backend in self.backends],
+        }
+
+    def _pick(self) -> Optional[OllamaBackend]:
+        # Least outstanding requests; ties go to the backend listed first
+        candidates = [backend for backend in self.backends if backend.has_capacity()]
+        return min(candidates, key=lambda backend: backend.in_flight) if candidates else None
+
+    def _lease(self, backend: OllamaBackend) -> OllamaLease:
+        backend.in_flight += 1
+        backend.requests += 1
+        metrics.OLLAMA_BACKEND_IN_FLIGHT.labels(backend.url).set(backend.in_flight)
+        return OllamaLease(self, backend)
+
+    def _release(self, backend: OllamaBackend):
+        backend.in_flight -= 1
+        metrics.OLLAMA_BACKEND_IN_FLIGHT.labels(backend.url).set(backend.in_flight)
+        self._dispatch()
+
+    def _dispatch(self):
+        """
+        Hand free slots to waiting chats, oldest first.
+        """
+        while self._waiters:
+            backend = self._pick()
+            if backend is None:
+                break
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._lease(backend)
+            waiter.set_result(backend)
+        metrics.OLLAMA_QUEUE_DEPTH.set(len(self._waiters))
+
+    def _reject(self, detail: str, status_code: int, reason: str, retry_after: Optional[int] = None) -> OllamaUnavailable:
+        self.rejected += 1
+        metrics.OLLAMA_REJECTIONS.labels(reason).inc()
+        logger.warning(f"Rejecting chat: {detail}")
+        return OllamaUnavailable(detail, status_code, retry_after)
+
+    def _succeeded(self, backend: OllamaBackend):
+        backend.failures = 0
+
+    def _failed(self, backend: OllamaBackend, error: Exception):
+        backend.failures += 1
+        logger.warning(f"Chat on Ollama backend {backend.url} failed ({backend.failures} in a row): {error}")
+        if backend.healthy and backend.failures >= self.max_failures:
+            self._set_healthy(backend, False)
+
+    def _set_healthy(self, backend: OllamaBackend, healthy: bool):
+        if backend.healthy == healthy:
+            return
+        backend.healthy = healthy
+        metrics.OLLAMA_BACKEND_HEALTHY.labels(backend.url).set(1 if healthy else 0)
+        if healthy:
+            backend.failures = 0
+            backend.probe_at = None
+            logger.info(f"Ollama backend {backend.url} is healthy again, adding it back to the pool.")
+            self._dispatch()
+            return
+        logger.warning(f"Ejecting Ollama backend {backend.url} from the pool.")
+        backend.probe_at = time.monotonic() + self.eject_cooldown
+        if not any(b.healthy for b in self.backends):
+            # Nothing will free up a slot for the waiting chats, fail them now
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    waiter.set_exception(self._reject("No healthy Ollama backend", 503, "unavailable"))
+            metrics.OLLAMA_QUEUE_DEPTH.set(0)
+
+    async def _check(self, backend: OllamaBackend):
+        try:
+            response = await backend.client.get("/api/tags", timeout=self.health_timeout)
+            response.raise_for_status()
+        except Exception as e:
+            if backend.healthy:
+                logger.warning(f"Health check of Ollama backend {backend.url} failed: {e}")
+            self._set_healthy(backend, False)
+            return
+        self._set_healthy(backend, True)
+
+    async def _probe_ejected(self):
+        """
+        Health-check the ejected backends whose cool-down is over. Their next
+        probe is pushed back first, so concurrent chats probe each one once.
+        """
+        now = time.monotonic()
+        due = [backend for backend in self.backends if not backend.healthy and backend.probe_at is not None and backend.probe_at <= now]
+        if not due:
+            return
+        for backend in due:
+            backend.probe_at = now + self.eject_cooldown
+        await asyncio.gather(*(self._check(backend) for backend in due))
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"Ollama health check failed: {e}")
@@ -1,13 +1,17 @@
 import logging
-from opensearchpy import OpenSearch
-from sentence_transformers import SentenceTransformer
-from typing import List, Tuple
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from opensearchpy import NotFoundError, OpenSearch, helpers
+from typing import Iterator, List, Optional, Tuple, Union
 from config import Config
+from external_services.vector_store import VectorStore, check_add_lengths, content_id, decode_cursor, encode_cursor, reciprocal_rank_fusion, weighted_score_fusion
 
 
 logger = logging.getLogger(__name__)
 
-class OpenSearchManager:
+class OpenSearchManager(VectorStore):
     def __init__(
         self,
         host: str = "opensearch",
@@ -17,7 +21,16 @@ class OpenSearchManager:
         use_ssl: bool = True,
         verify_certs: bool = False,
         vector_dim: int = 384,
-        index_name: str = "doc-embeddings"
+        index_name: str = "doc-embeddings",
+        embedder=None,
+        knn_engine: str = Config.OPENSEARCH_KNN_ENGINE,
+        space_type: str = Config.OPENSEARCH_SPACE_TYPE,
+        hnsw_m: int = Config.OPENSEARCH_HNSW_M,
+        hnsw_ef_construction: int = Config.OPENSEARCH_HNSW_EF_CONSTRUCTION,
+        hnsw_ef_search: int = Config.OPENSEARCH_HNSW_EF_SEARCH,
+        shards: int = Config.OPENSEARCH_SHARDS,
+        replicas: int = Config.OPENSEARCH_REPLICAS,
+        vector_encoding: str = Config.OPENSEARCH_VECTOR_ENCODING,
     ):
         self.host = host
         self.port = port
@@ -26,10 +39,27 @@ class OpenSearchManager:
         self.use_ssl = use_ssl
         self.verify_certs = verify_certs
         self.vector_dim = vector_dim
+        # `index_name` is an alias pointing at a versioned index (`<alias>-v<timestamp>`)
         self.index_name = index_name
+        self.knn_engine = knn_engine
+        self.space_type = space_type
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+        self.shards = shards
+        self.replicas = replicas
+        self.vector_encoding = vector_encoding  # float | fp16 | byte
 
         self.client = None
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
+        self.embedder = embedder
+        self.reindex_status = {"state": "idle"}
+        self._reindex_lock = threading.Lock()
+        # While a reindex copies into a new index, writes go to it as well
+        self._reindex_target = None
+        self._reindex_deleted = set()
+        self._writes = threading.Condition()
+        self._active_writes = 0
+        self._writes_held = False
 
     def connect(self):
         logger.info(f"Connecting to OpenSearch at {self.host}:{self.port}...")
@@ -44,46 +74,327 @@ class OpenSearchManager:
         logger.info(f"Connected to OpenSearch cluster: {info['cluster_name']}")
         return info
 
-    def create_index(self):
-        if self.client.indices.exists(self.index_name):
-            logger.info(f"Deleting existing index '{self.index_name}'...")
-            self.client.indices.delete(index=self.index_name)
-        
-        logger.info(f"Creating index '{self.index_name}' with KNN vector search...")
-        self.client.indices.create(
-            index=self.index_name,
-            body={
-                "settings": {
-                    "index": {
-                        "knn": True
-                    }
-                },
-                "mappings": {
-                    "properties": {
-                        "content": {"type": "text"},
-                        "embedding": {
-                            "type": "knn_vector",
-                            "dimension": self.vector_dim
-                        }
-                    }
+    def index_body(self) -> dict:
+        """
+        Settings and mapping for a new versioned index, from the configured
+        engine, space type, HNSW parameters and vector encoding.
+        """
+        method = {
+            "name": "hnsw",
+            "engine": self.knn_engine,
+            "space_type": self.space_type,
+            "parameters": {
+                "m": self.hnsw_m,
+                "ef_construction": self.hnsw_ef_construction,
+            },
+        }
+        embedding = {
+            "type": "knn_vector",
+            "dimension": self.vector_dim,
+            "method": method,
+        }
+        if self.vector_encoding == "fp16":
+            if self.knn_engine != "faiss":
+                raise ValueError("fp16 vector encoding requires the faiss engine")
+            method["parameters"]["encoder"] = {"name": "sq", "parameters": {"type": "fp16"}}
+        elif self.vector_encoding == "byte":
+            embedding["data_type"] = "byte"
+
+        return {
+            "settings": {
+                "index": {
+                    "knn": True,
+                    "knn.algo_param.ef_search": self.hnsw_ef_search,
+                    "number_of_shards": self.shards,
+                    "number_of_replicas": self.replicas,
+                }
+            },
+            "mappings": {
+                "_meta": {"vector_encoding": self.vector_encoding},
+                "properties": {
+                    "doc_id": {"type": "keyword"},
+                    "content": {"type": "text"},
+                    "metadata": {"type": "object", "enabled": False},
+                    "embedding": embedding,
                 }
             }
+        }
+
+    def create_index(self) -> str:
+        """
+        Create an empty versioned index and atomically point the alias at it.
+        The previous index keeps serving searches until the swap.
+        """
+        new_index = self._create_versioned_index()
+        self._swap_alias(new_index)
+        return new_index
+
+    def _create_versioned_index(self) -> str:
+        new_index = f"{self.index_name}-v{int(time.time() * 1000)}"
+        logger.info(f"Creating index '{new_index}' with KNN vector search ({self.knn_engine}, {self.space_type}, m={self.hnsw_m}, encoding={self.vector_encoding})...")
+        self.client.indices.create(index=new_index, body=self.index_body())
+        return new_index
+
+    def _alias_targets(self) -> List[str]:
+        if self.client.indices.exists_alias(name=self.index_name):
+            return list(self.client.indices.get_alias(name=self.index_name).keys())
+        return []
+
+    def _swap_alias(self, new_index: str):
+        old_indices = self._alias_targets()
+        actions = [{"remove": {"index": old, "alias": self.index_name}} for old in old_indices]
+        if not old_indices and self.client.indices.exists(self.index_name):
+            # Pre-alias deployments have a concrete index under the alias name
+            actions.append({"remove_index": {"index": self.index_name}})
+        actions.append({"add": {"index": new_index, "alias": self.index_name}})
+        self.client.indices.update_aliases(body={"actions": actions})
+        logger.info(f"Alias '{self.index_name}' now points to '{new_index}'.")
+        for old in old_indices:
+            self.client.indices.delete(index=old)
+            logger.info(f"Deleted previous index '{old}'.")
+
+    def _source_index(self) -> Optional[str]:
+        targets = self._alias_targets()
+        if targets:
+            return targets[0]
+        return self.index_name if self.client.indices.exists(self.index_name) else None
+
+    def start_reindex(self) -> dict:
+        """
+        Rebuild the index with the current settings in a background thread.
+        """
+        if not self._reindex_lock.acquire(blocking=False):
+            return self.reindex_status
+        self.reindex_status = {"state": "running", "started_at": time.time()}
+        threading.Thread(target=self._run_reindex, name="opensearch-reindex", daemon=True).start()
+        return self.reindex_status
+
+    def _run_reindex(self):
+        try:
+            self.reindex_status.update(self.reindex())
+            self.reindex_status["state"] = "done"
+        except Exception as e:
+            logger.error(f"Reindex failed: {e}")
+            self.reindex_status.update({"state": "failed", "error": str(e)})
+        finally:
+            self.reindex_status["finished_at"] = time.time()
+            self._reindex_lock.release()
+
+    def reindex(self) -> dict:
+        """
+        Copy every document into a new versioned index built from the current
+        settings, then swap the alias atomically.
+
+        From the moment the new index exists, writes and deletes go to both
+        indices, so the copy uses `op_type: create` and never overwrites a
+        newer write. Deletes made during the copy are applied to the new index
+        again before the swap, since the copy may have read the document
+        before it was deleted. Writes are held back briefly while the mirror
+        is switched on and while the alias is swapped, so none are lost.
+        """
+        source = self._source_index()
+        new_index = self._create_versioned_index()
+        if source is None:
+            self._swap_alias(new_index)
+            return {"index": new_index, "copied": 0}
+
+        with self._writes_held_back():
+            self._reindex_target = new_index
+            self._reindex_deleted = set()
+        try:
+            body = {
+                "conflicts": "proceed",
+                "source": {"index": source},
+                "dest": {"index": new_index, "op_type": "create"},
+                "script": {"source": self._reindex_script(source), "lang": "painless"},
+            }
+            task = self.client.reindex(body=body, wait_for_completion=False, refresh=True)
+            result = self._wait_for_task(task["task"])
+            if result.get("failures"):
+                raise RuntimeError(f"Reindex into '{new_index}' failed: {result['failures'][:3]}")
+
+            with self._writes_held_back():
+                if self._reindex_deleted:
+                    self._bulk_delete(new_index, list(self._reindex_deleted))
+                self.client.indices.refresh(index=new_index)
+                self._swap_alias(new_index)
+                self._reindex_target = None
+        except Exception:
+            with self._writes_held_back():
+                self._reindex_target = None
+            self.client.indices.delete(index=new_index, ignore_unavailable=True)
+            raise
+        finally:
+            self._reindex_deleted = set()
+        return {"index": new_index, "copied": result.get("created", 0)}
+
+    @contextmanager
+    def _writing(self):
+        """
+        Register an in-flight write and yield the indices it goes to: the
+        alias, plus the new index while a reindex is copying into it.
+        """
+        with self._writes:
+            self._writes.wait_for(lambda: not self._writes_held)
+            self._active_writes += 1
+            targets = [self.index_name] + ([self._reindex_target] if self._reindex_target else [])
+        try:
+            yield targets
+        finally:
+            with self._writes:
+                self._active_writes -= 1
+                self._writes.notify_all()
+
+    @contextmanager
+    def _writes_held_back(self):
+        # Wait for in-flight writes to finish and keep new ones waiting
+        with self._writes:
+            self._writes_held = True
+            try:
+                self._writes.wait_for(lambda: self._active_writes == 0)
+                yield
+            finally:
+                self._writes_held = False
+                self._writes.notify_all()
+
+    def _reindex_script(self, source: str) -> str:
+        # Backfill `doc_id` (the pagination sort key) for documents indexed before it existed
+        script = "ctx._source.doc_id = ctx._id;"
+        # Byte vectors hold embeddings scaled to [-127, 127]; convert when the encoding changes
+        mapping = self.client.indices.get_mapping(index=source)[source]["mappings"]
+        source_encoding = mapping.get("_meta", {}).get("vector_encoding", "float")
+        if (source_encoding == "byte") == (self.vector_encoding == "byte"):
+            return script
+        if self.vector_encoding == "byte":
+            expression = "Math.round(Math.max(-1.0, Math.min(1.0, v.doubleValue())) * 127)"
+        else:
+            expression = "v.doubleValue() / 127.0"
+        return script + (
+            " def out = new ArrayList();"
+            f" for (def v : ctx._source.embedding) {{ out.add({expression}); }}"
+            " ctx._source.embedding = out;"
         )
 
+    def _wait_for_task(self, task_id: str, poll_interval: float = 2.0) -> dict:
+        while True:
+            task = self.client.tasks.get(task_id=task_id)
+            status = task["task"]["status"]
+            self.reindex_status["progress"] = {"total": status.get("total", 0), "created": status.get("created", 0)}
+            if task.get("completed"):
+                if "error" in task:
+                    raise RuntimeError(task["error"])
+                return task.get("response", {})
+            time.sleep(poll_interval)
+
+    def _encode_vector(self, vector) -> list:
+        if self.vector_encoding == "byte":
+            return [int(round(max(-1.0, min(1.0, float(x))) * 127)) for x in vector]
+        return [float(x) for x in vector]
+
+    def ensure_index(self):
+        if not self.client.indices.exists(self.index_name):
+            self.create_index()
+
+    def health(self) -> dict:
+        return self.client.cluster.health()
+
     def index_documents(self, texts: List[str]):
         logger.info(f"Indexing {len(texts)} documents into '{self.index_name}'...")
-        for i, text in enumerate(texts):
-            embedding = self.model.encode(text).tolist()
-            self.client.index(index=self.index_name, id=i, body={
-                "content": text,
-                "embedding": embedding
-            })
-        self.client.indices.refresh(index=self.index_name)
-        logger.info("Indexing completed and index refreshed.")
-
-    def search(self, query: str, k: int = 3) -> List[Tuple[str, float]]:
-        logger.info(f"Searching for top-{k} documents similar to: '{query}'")
-        query_vec = self.model.encode(query).tolist()
+        result = self.bulk_index(texts, ids=[content_id(text) for text in texts])
+        logger.info(f"Indexing completed: {result['indexed']} indexed, {len(result['errors'])} failed.")
+        return result
+
+    def bulk_index(
+        self,
+        texts: List[str],
+        ids: List[str],
+        chunk_size: int = Config.OPENSEARCH_BULK_CHUNK_SIZE,
+        refresh: bool = True,
+        embeddings: Optional[np.ndarray] = None,
+        metadatas: Optional[List[dict]] = None,
+    ) -> dict:
+        """
+        Embed and index `texts` with the `_bulk` API, `chunk_size` documents per
+        request. Per-document failures are collected and returned instead of
+        aborting the whole load; the index is refreshed once at the end.
+        """
+        indexed = 0
+        errors = []
+        failed = set()
+        position = {doc_id: i for i, doc_id in enumerate(ids)}
+        for start in range(0, len(texts), chunk_size):
+            end = start + chunk_size
+            chunk_ids = ids[start:end]
+            vectors = embeddings[start:end] if embeddings is not None else self.embedder.encode(texts[start:end])
+            chunk_metadatas = metadatas[start:end] if metadatas is not None else [None] * len(chunk_ids)
+            # Registered per request, so a long load never holds up a reindex's alias swap
+            with self._writing() as targets:
+                if len(targets) > 1:
+                    self._reindex_deleted.difference_update(chunk_ids)
+                for ok, item in helpers.streaming_bulk(
+                    self.client,
+                    self._bulk_actions(targets, chunk_ids, texts[start:end], vectors, chunk_metadatas),
+                    chunk_size=len(chunk_ids) * len(targets),
+                    raise_on_error=False,
+                    raise_on_exception=False,
+                ):
+                    info = next(iter(item.values()))
+                    mirror = len(targets) > 1 and info.get("_index") == targets[1]
+                    if ok:
+                        indexed += not mirror
+                        continue
+                    doc_id = info.get("_id")
+                    if doc_id in failed:
+                        continue
+                    failed.add(doc_id)
+                    errors.append({"id": doc_id, "position": position.get(doc_id), "error": self._item_error(info)})
+                    logger.warning(f"Failed to index document {doc_id}{' into the reindex target' if mirror else ''}: {errors[-1]['error']}")
+
+        if refresh:
+            self.refresh()
+        return {"indexed": indexed, "errors": errors}
+
+    @staticmethod
+    def _item_error(info: dict):
+        # A transport failure puts the Exception itself in the item, which would not serialize
+        return info["error"] if "error" in info else str(info.get("exception"))
+
+    def _bulk_actions(self, targets, ids, texts, vectors, metadatas) -> Iterator[dict]:
+        for doc_id, text, embedding, metadata in zip(ids, texts, vectors, metadatas):
+            source = {"doc_id": doc_id, "content": text, "embedding": self._encode_vector(embedding)}
+            if metadata:
+                source["metadata"] = metadata
+            for index in targets:
+                yield {
+                    "_op_type": "index",
+                    "_index": index,
+                    "_id": doc_id,
+                    "_source": source,
+                }
+
+    # --- VectorStore ---
+
+    def add(self, texts, ids, embeddings=None, metadatas=None, chunk_size=None, refresh=True) -> dict:
+        check_add_lengths(texts, ids, embeddings, metadatas)
+        self.ensure_index()
+        return self.bulk_index(
+            texts,
+            ids=ids,
+            chunk_size=chunk_size or Config.OPENSEARCH_BULK_CHUNK_SIZE,
+            refresh=refresh,
+            embeddings=embeddings,
+            metadatas=metadatas,
+        )
+
+    def refresh(self):
+        with self._writing() as targets:
+            self.client.indices.refresh(index=",".join(targets))
+
+    def search(self, query: Union[str, np.ndarray], k: int = 3) -> List[dict]:
+        if isinstance(query, str):
+            logger.info(f"Searching for top-{k} documents similar to: '{query}'")
+            query = self.embedder.encode(query)
+        query_vec = self._encode_vector(query)
         body = {
             "size": k,
             "query": {
@@ -95,13 +406,222 @@ class OpenSearchManager:
                 }
             }
         }
+        body["_source"] = {"excludes": ["embedding"]}
         result = self.client.search(index=self.index_name, body=body)
-        return [(hit["_source"]["content"], hit["_score"]) for hit in result["hits"]["hits"]]
+        return [self._hit_to_doc(hit) for hit in result["hits"]["hits"]]
+
+    def hybrid_search(
+        self,
+        query_text: str,
+        query_vector: np.ndarray,
+        k: int = 3,
+        lexical_weight: float = 0.5,
+        vector_weight: float = 0.5,
+        fusion: str = "rrf",
+        candidates: Optional[int] = None,
+    ) -> List[dict]:
+        """
+        Run the kNN and BM25 queries together in one `_msearch` round trip and
+        fuse the two rankings client-side, either with reciprocal-rank fusion
+        or with min-max normalized, weighted scores.
+        """
+        candidates = max(k, candidates or Config.HYBRID_CANDIDATES_FACTOR * k)
+        source = {"excludes": ["embedding"]}
+        knn_body = {
+            "size": candidates,
+            "_source": source,
+            "query": {
+                "knn": {
+                    "embedding": {
+                        "vector": self._encode_vector(query_vector),
+                        "k": candidates
+                    }
+                }
+            }
+        }
+        bm25_body = {
+            "size": candidates,
+            "_source": source,
+            "query": {
+                "match": {
+                    "content": query_text
+                }
+            }
+        }
+        response = self.client.msearch(body=[
+            {"index": self.index_name}, knn_body,
+            {"index": self.index_name}, bm25_body,
+        ])
+        result_lists = []
+        for item in response["responses"]:
+            if "error" in item:
+                raise RuntimeError(f"Hybrid search sub-query failed: {item['error']}")
+            result_lists.append([self._hit_to_doc(hit) for hit in item["hits"]["hits"]])
+
+        weights = [vector_weight, lexical_weight]
+        if fusion == "weighted":
+            return weighted_score_fusion(result_lists, weights, k)
+        return reciprocal_rank_fusion(result_lists, weights, k, rank_constant=Config.HYBRID_RRF_K)
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        try:
+            doc = self.client.get(index=self.index_name, id=doc_id, _source_excludes=["embedding"])
+        except NotFoundError:
+            # Missing document or missing index
+            return None
+        return self._hit_to_doc(doc)
+
+    def delete(self, doc_id: str) -> bool:
+        with self._writing() as targets:
+            for index in targets[1:]:
+                self._reindex_deleted.add(doc_id)
+                try:
+                    self.client.delete(index=index, id=doc_id)
+                except NotFoundError:
+                    pass
+            try:
+                self.client.delete(index=self.index_name, id=doc_id)
+            except NotFoundError:
+                return False
+        return True
+
+    def get_many(self, doc_ids: List[str]) -> List[Optional[dict]]:
+        if not doc_ids:
+            return []
+        try:
+            response = self.client.mget(index=self.index_name, body={"ids": doc_ids}, _source_excludes=["embedding"])
+        except NotFoundError:
+            return [None] * len(doc_ids)
+        return [self._hit_to_doc(doc) if doc.get("found") else None for doc in response["docs"]]
+
+    def exists_many(self, doc_ids: List[str]) -> List[bool]:
+        if not doc_ids:
+            return []
+        try:
+            response = self.client.mget(index=self.index_name, body={"ids": doc_ids}, _source=False)
+        except NotFoundError:
+            return [False] * len(doc_ids)
+        return [bool(doc.get("found")) for doc in response["docs"]]
+
+    def delete_many(self, doc_ids: List[str], refresh: bool = True) -> dict:
+        doc_ids = list(dict.fromkeys(doc_ids))
+        result = {"deleted": [], "not_found": [], "errors": []}
+        chunk_size = Config.OPENSEARCH_BULK_CHUNK_SIZE
+        for start in range(0, len(doc_ids), chunk_size):
+            chunk = doc_ids[start:start + chunk_size]
+            with self._writing() as targets:
+                for index in targets[1:]:
+                    self._reindex_deleted.update(chunk)
+                    self._bulk_delete(index, chunk)
+                for key, values in self._bulk_delete(self.index_name, chunk).items():
+                    result[key].extend(values)
+        if refresh and result["deleted"]:
+            self.refresh()
+        return result
+
+    def _bulk_delete(self, index: str, doc_ids: List[str]) -> dict:
+        result = {"deleted": [], "not_found": [], "errors": []}
+        actions = ({"_op_type": "delete", "_index": index, "_id": doc_id} for doc_id in doc_ids)
+        for ok, item in helpers.streaming_bulk(
+            self.client,
+            actions,
+            chunk_size=Config.OPENSEARCH_BULK_CHUNK_SIZE,
+            raise_on_error=False,
+            raise_on_exception=False,
+        ):
+            info = item["delete"]
+            if ok:
+                result["deleted"].append(info["_id"])
+            elif info.get("status") == 404:
+                result["not_found"].append(info["_id"])
+            else:
+                result["errors"].append({"id": info["_id"], "error": self._item_error(info)})
+                logger.warning(f"Failed to delete document {info['_id']} from '{index}': {result['errors'][-1]['error']}")
+        return result
+
+    def reset(self):
+        # The reindex lock keeps a reset from deleting the index a reindex is copying
+        if not self._reindex_lock.acquire(blocking=False):
+            raise RuntimeError("A reindex is running; reset the index after it has finished.")
+        try:
+            self.create_index()
+        finally:
+            self._reindex_lock.release()
+
+    def count(self) -> int:
+        if not self.client.indices.exists(self.index_name):
+            return 0
+        return self.client.count(index=self.index_name)["count"]
+
+    def list(self, limit: int = 100) -> List[dict]:
+        if not self.client.indices.exists(self.index_name):
+            return []
+        response = self.client.search(
+            index=self.index_name,
+            body={
+                "size": limit,
+                "_source": ["content", "metadata"],
+                "query": {
+                    "match_all": {}
+                }
+            }
+        )
+        return [self._hit_to_doc(hit) for hit in response.get("hits", {}).get("hits", [])]
+
+    def list_page(self, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        Page through the index in `doc_id` order with a point in time and
+        `search_after`, so pages are consistent and not capped by the 10k
+        result window. The point in time is closed after the last page.
+        """
+        if cursor is not None:
+            state = decode_cursor(cursor, pit=str, after=(list, type(None)))
+        elif self.client.indices.exists(self.index_name):
+            pit = self.client.create_pit(index=self.index_name, keep_alive=Config.OPENSEARCH_PIT_KEEP_ALIVE)
+            state = {"pit": pit["pit_id"], "after": None}
+        else:
+            return [], None
+
+        body = {
+            "size": limit,
+            "_source": ["content", "metadata"],
+            "query": {"match_all": {}},
+            "pit": {"id": state["pit"], "keep_alive": Config.OPENSEARCH_PIT_KEEP_ALIVE},
+            # `_doc` only breaks ties between documents indexed before `doc_id` was added
+            "sort": [{"doc_id": {"order": "asc", "unmapped_type": "keyword", "missing": "_last"}}, {"_doc": "asc"}],
+        }
+        if state["after"] is not None:
+            body["search_after"] = state["after"]
+        response = self.client.search(body=body)
+        hits = response.get("hits", {}).get("hits", [])
+        pit_id = response.get("pit_id", state["pit"])
+
+        if len(hits) < limit:
+            self.client.delete_pit(body={"pit_id": [pit_id]})
+            return [self._hit_to_doc(hit) for hit in hits], None
+        return [self._hit_to_doc(hit) for hit in hits], encode_cursor({"pit": pit_id, "after": hits[-1]["sort"]})
+
+    def close_cursor(self, cursor: str):
+        try:
+            self.client.delete_pit(body={"pit_id": [decode_cursor(cursor, pit=str)["pit"]]})
+        except Exception as e:
+            logger.warning(f"Could not close point in time: {e}")
+
+    @staticmethod
+    def _hit_to_doc(hit: dict) -> dict:
+        doc = {
+            "id": hit["_id"],
+            "text": hit["_source"]["content"],
+            "metadata": hit["_source"].get("metadata", {}),
+        }
+        if "_score" in hit:
+            doc["score"] = hit["_score"]
+        return doc
 
     def delete_index(self):
-        if self.client.indices.exists(self.index_name):
-            self.client.indices.delete(index=self.index_name)
-            logger.info(f"Index '{self.index_name}' deleted.")
+        for index in self._alias_targets() or ([self.index_name] if self.client.indices.exists(self.index_name) else []):
+            self.client.indices.delete(index=index)
+            logger.info(f"Index '{index}' deleted.")
 
     def disconnect(self):
         logger.info("Disconnecting from OpenSearch.")
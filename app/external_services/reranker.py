@@ -0,0 +1,92 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+import metrics
+from config import Config
+
+
+logger = logging.getLogger(__name__)
+
+class Reranker:
+    """
+    Cross-encoder reranking of retrieved candidates.
+
+    All (query, document) pairs of one request are scored in a single
+    batched `CrossEncoder.predict` call. Scores are cached per pair (LRU of
+    `cache_size`), so repeated queries over the same documents skip the
+    model. The model is loaded on first use.
+    """
+
+    def __init__(
+        self,
+        model_name: str = Config.RERANK_MODEL_NAME,
+        batch_size: int = Config.RERANK_BATCH_SIZE,
+        cache_size: int = Config.RERANK_CACHE_SIZE,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.model = None
+
+        self.hits = 0
+        self.misses = 0
+        self._scores = OrderedDict()  # sha1(query, text) -> score
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self.model is None:
+                from sentence_transformers import CrossEncoder
+
+                logger.info(f"Loading rerank model '{self.model_name}'...")
+                self.model = CrossEncoder(self.model_name, device="cpu")
+        return self.model
+
+    def rerank(self, query: str, docs: List[dict], k: int) -> List[dict]:
+        """
+        Return the `k` best of `docs` by cross-encoder score. The score
+        replaces `score`; the first-stage score is kept as `retrieval_score`.
+        """
+        if not docs:
+            return []
+        keys = [self._key(query, doc["text"]) for doc in docs]
+        with self._lock:
+            scores = [self._scores.get(key) for key in keys]
+            for key, score in zip(keys, scores):
+                if score is not None:
+                    self._scores.move_to_end(key)
+            missing = [i for i, score in enumerate(scores) if score is None]
+            self.hits += len(docs) - len(missing)
+            self.misses += len(missing)
+        metrics.record_cache("rerank", len(docs) - len(missing), len(missing))
+
+        if missing:
+            model = self.model or self.load()
+            predicted = np.asarray(
+                model.predict([(query, docs[i]["text"]) for i in missing], batch_size=self.batch_size),
+                dtype=np.float32,
+            )
+            with self._lock:
+                for i, score in zip(missing, predicted):
+                    scores[i] = float(score)
+                    self._scores[keys[i]] = float(score)
+                while len(self._scores) > self.cache_size:
+                    self._scores.popitem(last=False)
+
+        ranked = sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)[:k]
+        return [{**docs[i], "score": scores[i], "retrieval_score": docs[i].get("score")} for i in ranked]
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.model is not None,
+            "entries": len(self._scores),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _key(self, query: str, text: str) -> bytes:
+        return hashlib.sha1(f"{self.model_name}\0{query}\0{text}".encode("utf-8")).digest()
@@ -0,0 +1,227 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import pymongo
+from config import Config
+
+
+logger = logging.getLogger(__name__)
+
+ROLES = ("system", "user", "assistant")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+class SessionStore:
+    """
+    Chat session storage. Messages are dicts with `role` and `content`, as
+    sent to Ollama; implementations are free to store them more compactly.
+    """
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def create(self) -> str:
+        raise NotImplementedError
+
+    def exists(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def append(self, session_id: str, messages: List[dict]):
+        raise NotImplementedError
+
+    def get_messages(self, session_id: str) -> List[dict]:
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+
+class _Session:
+    __slots__ = ("last_access", "messages")
+
+    def __init__(self):
+        self.last_access = time.monotonic()
+        # (role code, content) tuples instead of one dict per message
+        self.messages = []
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Process-local store capped at `max_sessions` (least recently used are
+    evicted first) with sessions expiring `ttl_seconds` after last use.
+    Each session keeps at most `max_messages` messages.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = Config.SESSION_MAX_SESSIONS,
+        ttl_seconds: float = Config.SESSION_TTL_SECONDS,
+        max_messages: int = Config.SESSION_MAX_MESSAGES,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self) -> str:
+        session_id = str(uuid.uuid4())
+        with self._lock:
+            self._evict_expired()
+            self._sessions[session_id] = _Session()
+            while len(self._sessions) > self.max_sessions:
+                evicted, _ = self._sessions.popitem(last=False)
+                logger.debug(f"Evicted least recently used session {evicted}.")
+        return session_id
+
+    def exists(self, session_id: str) -> bool:
+        with self._lock:
+            return self._touch(session_id) is not None
+
+    def append(self, session_id: str, messages: List[dict]):
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None:
+                raise KeyError(session_id)
+            session.messages.extend((ROLE_CODES[m["role"]], m["content"]) for m in messages)
+            if len(session.messages) > self.max_messages:
+                del session.messages[:len(session.messages) - self.max_messages]
+
+    def get_messages(self, session_id: str) -> List[dict]:
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None:
+                raise KeyError(session_id)
+            return [{"role": ROLES[role], "content": content} for role, content in session.messages]
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def count(self) -> int:
+        with self._lock:
+            self._evict_expired()
+            return len(self._sessions)
+
+    def _touch(self, session_id: str):
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        now = time.monotonic()
+        if now - session.last_access > self.ttl_seconds:
+            del self._sessions[session_id]
+            return None
+        session.last_access = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _evict_expired(self):
+        # Sessions are kept in last-access order, so expired ones are at the front
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_access >= cutoff:
+                break
+            del self._sessions[session_id]
+
+
+class MongoSessionStore(SessionStore):
+    """
+    Sessions persisted in MongoDB through `MongoManager`, so they survive
+    restarts and are shared across uvicorn workers. New messages are
+    appended with `$push` instead of rewriting the history, and a TTL index
+    on `updated_at` expires idle sessions.
+    """
+
+    def __init__(
+        self,
+        dbm,
+        collection_name: str = "sessions",
+        ttl_seconds: float = Config.SESSION_TTL_SECONDS,
+        max_messages: int = Config.SESSION_MAX_MESSAGES,
+    ):
+        self.dbm = dbm
+        self.collection_name = collection_name
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.collection = None
+
+    def connect(self):
+        if self.dbm.get_db() is None:
+            self.dbm.connect_to_database()
+        self.collection = self.dbm.get_collection(self.collection_name)
+        self._ensure_ttl_index()
+        logger.info(f"Using MongoDB collection '{self.collection_name}' for chat sessions.")
+
+    def _ensure_ttl_index(self):
+        """
+        Create the TTL index on `updated_at`, or change its expiry in place with
+        `collMod` when SESSION_TTL_SECONDS changed since it was created
+        (`create_index` refuses to redefine it).
+        """
+        ttl = int(self.ttl_seconds)
+        for name, spec in self.collection.index_information().items():
+            if spec["key"] != [("updated_at", pymongo.ASCENDING)]:
+                continue
+            if "expireAfterSeconds" in spec:
+                if int(spec["expireAfterSeconds"]) == ttl:
+                    return
+                self.collection.database.command("collMod", self.collection_name, index={"name": name, "expireAfterSeconds": ttl})
+                logger.info(f"Changed the session TTL index expiry from {spec['expireAfterSeconds']}s to {ttl}s.")
+                return
+            # A plain index on the same key would conflict with the TTL index
+            self.collection.drop_index(name)
+        self.collection.create_index([("updated_at", pymongo.ASCENDING)], expireAfterSeconds=ttl)
+
+    def close(self):
+        if self.dbm.client is not None:
+            self.dbm.close_database_connection()
+
+    def create(self) -> str:
+        session_id = str(uuid.uuid4())
+        now = datetime.now(timezone.utc)
+        self.collection.insert_one({"_id": session_id, "created_at": now, "updated_at": now, "messages": []})
+        return session_id
+
+    def exists(self, session_id: str) -> bool:
+        return self.collection.count_documents({"_id": session_id, "updated_at": {"$gt": self._cutoff()}}, limit=1) > 0
+
+    def append(self, session_id: str, messages: List[dict]):
+        result = self.collection.update_one(
+            {"_id": session_id},
+            {
+                "$push": {"messages": {
+                    "$each": [{"r": ROLE_CODES[m["role"]], "c": m["content"]} for m in messages],
+                    "$slice": -self.max_messages,
+                }},
+                "$set": {"updated_at": datetime.now(timezone.utc)},
+            },
+        )
+        if result.matched_count == 0:
+            raise KeyError(session_id)
+
+    def get_messages(self, session_id: str) -> List[dict]:
+        doc = self.collection.find_one({"_id": session_id}, {"messages": 1})
+        if doc is None:
+            raise KeyError(session_id)
+        return [{"role": ROLES[m["r"]], "content": m["c"]} for m in doc.get("messages", [])]
+
+    def delete(self, session_id: str):
+        self.collection.delete_one({"_id": session_id})
+
+    def count(self) -> int:
+        return self.collection.count_documents({"updated_at": {"$gt": self._cutoff()}})
+
+    def _cutoff(self) -> datetime:
+        # The TTL monitor only runs once a minute, so filter expired sessions explicitly
+        return datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds)
@@ -0,0 +1,198 @@
+import base64
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+class VectorStore:
+    """
+    Common interface of the document vector backends (`OpenSearchManager`,
+    `FaissManager`). Documents are identified by string ids and returned as
+    dicts with `id`, `text`, `metadata` and, for searches, `score`.
+    """
+
+    def connect(self):
+        raise NotImplementedError
+
+    def disconnect(self):
+        raise NotImplementedError
+
+    def health(self) -> dict:
+        raise NotImplementedError
+
+    def add(
+        self,
+        texts: List[str],
+        ids: List[str],
+        embeddings: Optional[np.ndarray] = None,
+        metadatas: Optional[List[dict]] = None,
+        chunk_size: Optional[int] = None,
+        refresh: bool = True,
+    ) -> dict:
+        """
+        Insert or overwrite documents. `embeddings` are computed with the
+        shared embedder when not given. Returns `{"indexed": int, "errors": [...]}`.
+        """
+        raise NotImplementedError
+
+    def refresh(self):
+        """
+        Make documents added with `refresh=False` visible to searches. Backends
+        that apply writes immediately have nothing to do.
+        """
+
+    def search(self, query_vector: np.ndarray, k: int = 3) -> List[dict]:
+        raise NotImplementedError
+
+    def hybrid_search(
+        self,
+        query_text: str,
+        query_vector: np.ndarray,
+        k: int = 3,
+        lexical_weight: float = 0.5,
+        vector_weight: float = 0.5,
+        fusion: str = "rrf",
+        candidates: Optional[int] = None,
+    ) -> List[dict]:
+        """
+        Lexical (BM25) + vector retrieval fused into one ranking. Backends
+        without a lexical index fall back to vector search.
+        """
+        return self.search(query_vector, k=k)
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def delete(self, doc_id: str) -> bool:
+        raise NotImplementedError
+
+    def get_many(self, doc_ids: List[str]) -> List[Optional[dict]]:
+        """
+        Documents in the order of `doc_ids`, None for the missing ones.
+        """
+        return [self.get(doc_id) for doc_id in doc_ids]
+
+    def exists_many(self, doc_ids: List[str]) -> List[bool]:
+        return [doc is not None for doc in self.get_many(doc_ids)]
+
+    def delete_many(self, doc_ids: List[str], refresh: bool = True) -> dict:
+        """
+        Delete documents by id. Returns `{"deleted": [...], "not_found": [...]}`.
+        """
+        result = {"deleted": [], "not_found": []}
+        for doc_id in doc_ids:
+            result["deleted" if self.delete(doc_id) else "not_found"].append(doc_id)
+        return result
+
+    def reset(self):
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def list(self, limit: int = 100) -> List[dict]:
+        raise NotImplementedError
+
+    def list_page(self, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        One page of documents in a stable order, and the opaque cursor of the
+        next page (None after the last page).
+        """
+        raise NotImplementedError
+
+    def iter_documents(self, batch_size: int = 500) -> Iterator[dict]:
+        """
+        Walk every document, holding at most one page in memory.
+        """
+        cursor = None
+        try:
+            while True:
+                docs, cursor = self.list_page(batch_size, cursor)
+                yield from docs
+                if cursor is None:
+                    return
+        finally:
+            # Abandoned mid-walk (e.g. the client of an export disconnected)
+            if cursor is not None:
+                self.close_cursor(cursor)
+
+    def close_cursor(self, cursor: str):
+        """
+        Release what a `list_page` cursor holds on to when paging stops early.
+        """
+
+
+def check_add_lengths(texts: List[str], ids: Optional[List[str]], embeddings=None, metadatas=None):
+    """
+    Raise `ValueError` unless `ids`, `embeddings` and `metadatas` (when given)
+    have one entry per text.
+    """
+    for name, values in (("ids", ids), ("embeddings", embeddings), ("metadatas", metadatas)):
+        if values is not None and len(values) != len(texts):
+            raise ValueError(f"{name} has {len(values)} entries for {len(texts)} texts")
+
+
+def content_id(text: str) -> str:
+    """
+    Deterministic document id: hash of the text after Unicode (NFKC) and
+    whitespace normalization, so re-uploading the same content maps to the
+    same document.
+    """
+    normalized = re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+def encode_cursor(state: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, **fields) -> dict:
+    """
+    Decode a cursor made by `encode_cursor`, checking that it has each of
+    `fields` with a value of the given type(s).
+    """
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(state, dict) or any(not isinstance(state.get(name, ...), types) for name, types in fields.items()):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return state
+
+
+def reciprocal_rank_fusion(result_lists: List[List[dict]], weights: List[float], k: int, rank_constant: int = 60) -> List[dict]:
+    """
+    Fuse ranked lists by summing `weight / (rank_constant + rank)` per document.
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, dict] = {}
+    for results, weight in zip(result_lists, weights):
+        for rank, doc in enumerate(results, start=1):
+            scores[doc["id"]] = scores.get(doc["id"], 0.0) + weight / (rank_constant + rank)
+            docs.setdefault(doc["id"], doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [{**docs[doc_id], "score": scores[doc_id]} for doc_id in ranked]
+
+
+def weighted_score_fusion(result_lists: List[List[dict]], weights: List[float], k: int) -> List[dict]:
+    """
+    Fuse lists by min-max normalizing each list's scores to [0, 1] and
+    summing them with the given weights.
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, dict] = {}
+    for results, weight in zip(result_lists, weights):
+        if not results:
+            continue
+        raw = [doc["score"] for doc in results]
+        low, high = min(raw), max(raw)
+        for doc in results:
+            normalized = (doc["score"] - low) / (high - low) if high > low else 1.0
+            scores[doc["id"]] = scores.get(doc["id"], 0.0) + weight * normalized
+            docs.setdefault(doc["id"], doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [{**docs[doc_id], "score": scores[doc_id]} for doc_id in ranked]
@@ -1,12 +1,23 @@
-from fastapi import FastAPI
+import startup
+
+with startup.timed("fastapi", "import"):
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.responses import FileResponse, JSONResponse, Response
+    from starlette.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
-from routers.llm import chat
-from routers.docs import document
+import asyncio
 import logging
 from colorlog import ColoredFormatter
 import os
 
-from external_services import dbm,osm
+with startup.timed("external_services", "import"):
+    from external_services import dbm,em,im,om,rr,ss,vs
+with startup.timed("routers", "import"):
+    from routers.llm import chat
+    from routers.docs import document
+from config import Config
+import metrics
+import profiling
 
 LOG_LEVEL = logging.DEBUG
 LOGFORMAT = "%(log_color)s%(asctime)-8s%(reset)s - %(log_color)s%(levelname)-8s%(reset)s | %(log_color)s%(message)s%(reset)s"
@@ -19,18 +30,57 @@ logger = logging.getLogger()
 logger.setLevel(LOG_LEVEL)
 logger.addHandler(stream)
 
+def warm_up():
+    """
+    Load the models and run one inference each so the first request does not
+    pay for it, then mark the service ready.
+    """
+    try:
+        with startup.timed("embedding model", "warmup"):
+            em.load()
+            em.encode("warm up")
+        if Config.EMBEDDING_PARITY_CHECK and em.backend != "torch":
+            with startup.timed("embedding parity check", "warmup"):
+                em.parity_check()
+        if Config.RERANK_ENABLED:
+            with startup.timed("rerank model", "warmup"):
+                rr.rerank("warm up", [{"id": "warm-up", "text": "warm up"}], 1)
+        startup.mark_ready()
+    except Exception as e:
+        startup.mark_failed(e)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Connect to MongoDB
     # dbm.connect_to_database()
-    osm.connect()
+    with startup.timed("vector store", "connect"):
+        vs.connect()
+    em.start()
+    with startup.timed("ollama client", "connect"):
+        await om.connect()
+    with startup.timed("session store", "connect"):
+        ss.connect()
+    if Config.WARMUP_IN_BACKGROUND:
+        # Accept requests right away; /ready reports when the models are loaded
+        warmup = asyncio.get_running_loop().run_in_executor(None, warm_up)
+    else:
+        warm_up()
     yield
+    if Config.WARMUP_IN_BACKGROUND:
+        await warmup
     # Close log file
     # dbm.close_database_connection()
-    osm.disconnect()
+    im.stop()
+    ss.close()
+    await om.disconnect()
+    em.stop()
+    vs.disconnect()
 
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Include the router from router/llm/chat.py
 # All routes defined in llm_chat.router will be prefixed with /llm
@@ -44,3 +94,46 @@ app.include_router(document.router, prefix="/docs", tags=["Documents"])
 def read_root():
     return {"message": "Ollama Chat API is running"}
 
+@app.get("/ready")
+def readiness():
+    """
+    200 once warm-up has loaded the models, 503 before that (or if it failed).
+    """
+    body = {
+        "ready": startup.ready.is_set(),
+        "error": startup.error,
+        "embedding_model": em.model is not None,
+        "rerank_model": rr.model is not None,
+    }
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+@app.get("/startup")
+def startup_report():
+    return startup.report()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Request, embedding, retrieval, LLM and cache metrics in Prometheus text format.
+    """
+    try:
+        metrics.SESSIONS.set(await run_in_threadpool(ss.count))
+    except Exception as e:
+        logger.warning(f"Could not count sessions for /metrics: {e}")
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+
+@app.get("/profiles/{profile_id}")
+def download_profile(profile_id: str, request: Request, format: str = "folded"):
+    """
+    Download a saved request profile: folded stacks (for flamegraph.pl,
+    speedscope, inferno) or `format=json` for the span tree.
+    """
+    if not profiling.authorized(request.headers.get("x-profile-token")):
+        raise HTTPException(status_code=403, detail="Profiling is disabled or the X-Profile-Token is invalid")
+    extension = "json" if format == "json" else "folded"
+    path = profiling.profile_path(profile_id, extension)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=f"{profile_id}.{extension}")
@@ -0,0 +1,156 @@
+"""
+Prometheus metrics for the request path, served at /metrics.
+
+Stages record into module-level collectors where they run: embedding in
+the EmbeddingManager, retrieval in `routers.retrieval`, Ollama prefill and
+generation in the OllamaManager (from the timings in its final `done`
+message), cache lookups in each cache. `MetricsMiddleware` records request
+latency and the number of requests in flight, streaming bodies included.
+"""
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, disable_created_metrics, generate_latest
+
+# Skip the per-series `*_created` timestamps, they only add scrape size
+disable_created_metrics()
+
+# Seconds; spans a cached embedding lookup up to a long generation
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 40, 50, 75, 100, 150, 200, 500)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the last body byte is sent",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled")
+
+EMBEDDING_SECONDS = Histogram(
+    "embedding_duration_seconds", "Time to embed the texts of one call, cache lookup and batching wait included",
+    buckets=LATENCY_BUCKETS,
+)
+EMBEDDING_BATCH_SECONDS = Histogram(
+    "embedding_batch_duration_seconds", "Model inference time per coalesced embedding batch",
+    buckets=LATENCY_BUCKETS,
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "embedding_batch_size", "Texts per coalesced embedding batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+RETRIEVAL_SECONDS = Histogram(
+    "retrieval_duration_seconds", "Retrieval time per stage (search, rerank, parents) and in total",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+
+LLM_TTFT_SECONDS = Histogram(
+    "llm_time_to_first_token_seconds", "Time from sending the chat request to Ollama until the first token arrives",
+    buckets=LATENCY_BUCKETS,
+)
+LLM_PROMPT_EVAL_SECONDS = Histogram(
+    "llm_prompt_eval_duration_seconds", "Ollama prompt evaluation (prefill) time, as reported by Ollama",
+    buckets=LATENCY_BUCKETS,
+)
+LLM_GENERATION_SECONDS = Histogram(
+    "llm_generation_duration_seconds", "Ollama token generation time, as reported by Ollama",
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "llm_tokens_per_second", "Ollama generation speed per reply",
+    buckets=TOKEN_RATE_BUCKETS,
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens processed by Ollama", ["kind"])  # prompt | completion
+
+OLLAMA_BACKEND_IN_FLIGHT = Gauge("ollama_backend_in_flight", "Chats in flight per Ollama backend", ["backend"])
+OLLAMA_BACKEND_HEALTHY = Gauge("ollama_backend_healthy", "1 while the Ollama backend is in the pool, 0 when ejected", ["backend"])
+OLLAMA_QUEUE_DEPTH = Gauge("ollama_queue_depth", "Chats waiting for a free Ollama backend")
+OLLAMA_QUEUE_WAIT_SECONDS = Histogram(
+    "ollama_queue_wait_seconds", "Time queued chats waited for a free Ollama backend",
+    buckets=LATENCY_BUCKETS,
+)
+OLLAMA_REJECTIONS = Counter("ollama_rejections_total", "Chats rejected by admission control", ["reason"])  # queue_full | queue_timeout | unavailable
+
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups", ["cache", "result"])  # result: hit | miss
+ERRORS = Counter("errors_total", "Errors by component", ["component"])
+
+SESSIONS = Gauge("chat_sessions", "Chat sessions in the session store")
+
+
+def record_cache(cache: str, hits: int, misses: int):
+    if hits:
+        CACHE_REQUESTS.labels(cache, "hit").inc(hits)
+    if misses:
+        CACHE_REQUESTS.labels(cache, "miss").inc(misses)
+
+
+def record_ollama_done(data: dict):
+    """
+    Record the timings Ollama reports in the final `done` message
+    (durations are in nanoseconds).
+    """
+    prompt_eval_ns = data.get("prompt_eval_duration")
+    eval_ns = data.get("eval_duration")
+    eval_count = data.get("eval_count")
+    if prompt_eval_ns:
+        LLM_PROMPT_EVAL_SECONDS.observe(prompt_eval_ns / 1e9)
+    if data.get("prompt_eval_count"):
+        LLM_TOKENS.labels("prompt").inc(data["prompt_eval_count"])
+    if eval_count:
+        LLM_TOKENS.labels("completion").inc(eval_count)
+    if eval_ns:
+        LLM_GENERATION_SECONDS.observe(eval_ns / 1e9)
+        if eval_count:
+            LLM_TOKENS_PER_SECOND.observe(eval_count / (eval_ns / 1e9))
+
+
+def render() -> tuple:
+    """
+    The current metrics in Prometheus text format and their content type.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request by its route template (so
+    `/docs/jobs/{job_id}` is one series), until the response body has been
+    fully sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_SECONDS.labels(scope["method"], route_template(scope), str(status)).observe(time.perf_counter() - start)
+
+
+def route_template(scope) -> str:
+    """
+    Path template of the matched route, with the prefix of the router it was
+    included from (which newer FastAPI versions leave out of `route.path`).
+    """
+    template = getattr(scope.get("route"), "path", None)
+    if not template:
+        return "unmatched"
+    # The last `segments` path segments are the ones the template matched
+    segments = template.rstrip("/").count("/")
+    path = scope["path"].rstrip("/")
+    prefix = path.rsplit("/", segments)[0] if segments else path
+    return prefix + template
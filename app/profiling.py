@@ -0,0 +1,283 @@
+"""
+Opt-in profiling of single requests.
+
+With PROFILING_ENABLED, a request sent with an `X-Profile: 1` header or a
+`?profile=1` query flag (plus `X-Profile-Token` when PROFILING_TOKEN is set)
+is profiled:
+
+- a sampling profiler records the Python stacks of the threads working on
+  the request every PROFILING_INTERVAL_MS and writes them to
+  `<PROFILING_DIR>/<id>.folded` in the folded-stack format read by
+  flamegraph.pl, speedscope and inferno; GET /profiles/{id} downloads it
+- `span()` blocks in the handlers and services build a timing tree, sent
+  back in the `X-Profile-Spans` and `Server-Timing` response headers and
+  saved to `<PROFILING_DIR>/<id>.json`
+
+Streaming responses send their headers before generation finishes, so spans
+still open at that point are marked `open`; the saved tree is complete.
+The event loop thread is shared by all requests, so its samples can include
+work done for other requests running at the same time.
+"""
+import contextvars
+import hmac
+import json
+import logging
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import parse_qs
+from uuid import uuid4
+
+import metrics
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_profile = contextvars.ContextVar("profile", default=None)
+_span = contextvars.ContextVar("profile_span", default=None)
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{16}$")
+# Frames from these directories are shown relative to them
+_LIBRARY_PATHS = sorted({sysconfig.get_paths()[key] + os.sep for key in ("purelib", "platlib", "stdlib")}, key=len, reverse=True)
+
+
+class Span:
+    __slots__ = ("name", "start", "end", "children")
+
+    def __init__(self, name: str, start: Optional[float] = None, end: Optional[float] = None):
+        self.name = name
+        self.start = time.perf_counter() if start is None else start
+        self.end = end
+        self.children = []
+
+    def to_dict(self, origin: float, now: float, max_depth: Optional[int] = None) -> dict:
+        node = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "ms": round(((self.end or now) - self.start) * 1000, 2),
+        }
+        if self.end is None:
+            node["open"] = True
+        if self.children and max_depth != 0:
+            depth = None if max_depth is None else max_depth - 1
+            node["children"] = [child.to_dict(origin, now, depth) for child in list(self.children)]
+        return node
+
+    def walk(self, prefix: str = ""):
+        path = f"{prefix}.{self.name}" if prefix else self.name
+        yield path, self
+        for child in list(self.children):
+            yield from child.walk(path)
+
+
+class Profile:
+    """
+    One profiled request: its span tree and the stack samples of the threads
+    currently inside one of its spans.
+    """
+
+    def __init__(self, name: str, interval_ms: float = Config.PROFILING_INTERVAL_MS):
+        self.id = uuid4().hex[:16]
+        self.root = Span(name)
+        self.interval = interval_ms / 1000.0
+        self.samples = Counter()
+        self._threads = Counter()  # thread ident -> open spans on that thread
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.id}", daemon=True)
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self.root.end = time.perf_counter()
+        self._stopped.set()
+        self._sampler.join(timeout=1)
+
+    def enter_thread(self):
+        with self._lock:
+            self._threads[threading.get_ident()] += 1
+
+    def exit_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    def spans(self, max_depth: Optional[int] = None) -> dict:
+        return self.root.to_dict(self.root.start, time.perf_counter(), max_depth)
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+
+    def save(self, directory: str = Config.PROFILING_DIR):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{self.id}.folded"), "w") as f:
+            f.write(self.folded())
+        with open(os.path.join(directory, f"{self.id}.json"), "w") as f:
+            json.dump({
+                "id": self.id,
+                "interval_ms": self.interval * 1000,
+                "samples": sum(self.samples.values()),
+                "spans": self.spans(),
+            }, f, indent=2)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                threads = [ident for ident in self._threads if ident != own]
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident in threads:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.samples[_fold(names.get(ident, str(ident)), frame)] += 1
+
+
+def _fold(thread_name: str, frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    stack.append(thread_name)
+    return ";".join(reversed(stack))
+
+
+def _short_path(filename: str) -> str:
+    for prefix in _LIBRARY_PATHS:
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return os.path.relpath(filename) if filename.startswith(os.getcwd()) else filename
+
+
+@contextmanager
+def span(name: str):
+    """
+    Time a block as a child of the current span, when the request is being
+    profiled; otherwise a no-op.
+    """
+    profile = _profile.get()
+    if profile is None:
+        yield
+        return
+    node = Span(name)
+    (_span.get() or profile.root).children.append(node)
+    token = _span.set(node)
+    profile.enter_thread()
+    try:
+        yield
+    finally:
+        node.end = time.perf_counter()
+        profile.exit_thread()
+        _span.reset(token)
+
+
+def add_span(name: str, start: float, end: float):
+    """
+    Record an already finished block (`time.perf_counter()` timestamps) under
+    the current span, e.g. time to first token inside a stream.
+    """
+    profile = _profile.get()
+    if profile is not None:
+        (_span.get() or profile.root).children.append(Span(name, start, end))
+
+
+def authorized(token: Optional[str]) -> bool:
+    if not Config.PROFILING_ENABLED:
+        return False
+    if not Config.PROFILING_TOKEN:
+        return True
+    return token is not None and hmac.compare_digest(token.encode(), Config.PROFILING_TOKEN.encode())
+
+
+def profile_path(profile_id: str, extension: str) -> Optional[str]:
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = os.path.join(Config.PROFILING_DIR, f"{profile_id}.{extension}")
+    return path if os.path.exists(path) else None
+
+
+def _requested(scope) -> bool:
+    headers = dict(scope["headers"])
+    if headers.get(b"x-profile", b"").lower() in (b"1", b"true"):
+        return True
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("profile", [""])[0].lower() in ("1", "true")
+
+
+def _server_timing(profile: Profile) -> str:
+    now = time.perf_counter()
+    entries = [f"total;dur={(now - profile.root.start) * 1000:.2f}"]
+    for child in list(profile.root.children):
+        for path, node in child.walk():
+            duration = ((node.end or now) - node.start) * 1000
+            entries.append(f'{re.sub(r"[^A-Za-z0-9_.-]", "_", path)};dur={duration:.2f}')
+    return ", ".join(entries)
+
+
+def _spans_header(profile: Profile) -> str:
+    # Drop the deepest levels until the tree fits in a response header
+    max_depth = None
+    while True:
+        value = json.dumps(profile.spans(max_depth), separators=(",", ":"))
+        if len(value) <= Config.PROFILING_HEADER_MAX_BYTES or max_depth == 0:
+            return value
+        max_depth = 3 if max_depth is None else max_depth - 1
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware starting a `Profile` for requests that ask for one and
+    are allowed to, and adding its span tree to the response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not Config.PROFILING_ENABLED or not _requested(scope):
+            await self.app(scope, receive, send)
+            return
+        token = dict(scope["headers"]).get(b"x-profile-token")
+        if not authorized(token.decode("latin-1") if token is not None else None):
+            logger.warning(f"Ignoring profiling request for {scope['path']} without a valid X-Profile-Token.")
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["path"])
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                profile.root.name = metrics.route_template(scope)
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile.id.encode()))
+                headers.append((b"x-profile-spans", _spans_header(profile).encode("latin-1", "replace")))
+                headers.append((b"server-timing", _server_timing(profile).encode("latin-1", "replace")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profile_token = _profile.set(profile)
+        span_token = _span.set(profile.root)
+        profile.enter_thread()
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            profile.exit_thread()
+            profile.stop()
+            _span.reset(span_token)
+            _profile.reset(profile_token)
+            try:
+                profile.save()
+                logger.info(f"Profiled {profile.root.name} in {profile.spans()['ms']} ms: {Config.PROFILING_DIR}/{profile.id}.folded")
+            except OSError as e:
+                logger.error(f"Could not save profile {profile.id}: {e}")
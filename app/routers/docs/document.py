@@ -1,21 +1,41 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
-from typing import List
-from sentence_transformers import SentenceTransformer
-from external_services import osm  # must provide `client`, `index_name`, `create_index`
-from uuid import uuid4
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional
+import json
+import profiling
+from config import Config
+from external_services import ac, ch, em, im, rr, vs  # `vs` is the configured VectorStore backend
+from external_services.chunker import chunk_id, chunk_ids_of
+from external_services.ingestion import IngestionQueueFull, plan_ingest
+from routers.retrieval import RetrievalOptions, get_parents, iter_parents, list_parents, retrieve
 
 router = APIRouter()
 
-EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
-INDEX_NAME = osm.index_name
-embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-
 # --- Models ---
 class DocumentAddRequest(BaseModel):
     texts: List[str] = Field(..., min_items=1)
+    chunk_size: Optional[int] = Field(None, ge=1, le=10000)  # documents per _bulk request
+    refresh: bool = True  # set to False for large loads and refresh once at the end
+    metadatas: Optional[List[dict]] = None  # one dict per text, stored alongside it
+    chunking: Optional[bool] = None  # split long texts into overlapping chunks (defaults to CHUNKING_ENABLED)
+    dedup: Optional[bool] = None  # content-hash ids, skip texts already stored (defaults to INGEST_DEDUP)
+
+    @model_validator(mode="after")
+    def check_metadatas(self):
+        if self.metadatas is not None and len(self.metadatas) != len(self.texts):
+            raise ValueError(f"metadatas has {len(self.metadatas)} entries for {len(self.texts)} texts")
+        return self
+
+class DocumentIdsRequest(BaseModel):
+    ids: List[str] = Field(..., min_items=1, max_items=10000)
+    refresh: bool = True  # delete-docs only
 
-class DocumentSearchRequest(BaseModel):
+class EmbeddingParityRequest(BaseModel):
+    texts: Optional[List[str]] = Field(None, min_items=1, max_items=1000)  # defaults to a built-in sample
+    min_cosine: float = Field(Config.EMBEDDING_PARITY_MIN_COSINE, ge=-1, le=1)
+
+class DocumentSearchRequest(RetrievalOptions):
     query: str = Field(..., min_length=1)
     top_k: int = Field(5, ge=1, le=100)
 
@@ -24,45 +44,92 @@ class DocumentSearchRequest(BaseModel):
 @router.get("/health")
 def health_check():
     try:
-        return {"status": osm.client.cluster.health()}
+        return {"status": vs.health()}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"OpenSearch not healthy: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Vector store not healthy: {str(e)}")
 
 @router.post("/add-docs")
 def add_documents(req: DocumentAddRequest):
     try:
-        if not osm.client.indices.exists(INDEX_NAME):
-            osm.create_index()
-
-        for text in req.texts:
-            doc_id = osm.get_next_doc_id() if hasattr(osm, "get_next_doc_id") else str(uuid4())
-            embedding = embedding_model.encode(text).tolist()
-            osm.client.index(index=INDEX_NAME, id=doc_id, body={"content": text, "embedding": embedding})
-
-        osm.client.indices.refresh(index=INDEX_NAME)
-        return {"message": f"{len(req.texts)} documents added."}
+        chunking = Config.CHUNKING_ENABLED if req.chunking is None else req.chunking
+        dedup = Config.INGEST_DEDUP if req.dedup is None else req.dedup
+        with profiling.span("plan"):
+            plan = plan_ingest(vs, ch, req.texts, req.metadatas, chunking=chunking, dedup=dedup)
+        items = plan["items"]
+        result = {"indexed": 0, "errors": []}
+        if items:
+            with profiling.span("index"):
+                result = vs.add(
+                    [item["text"] for item in items],
+                    ids=[item["id"] for item in items],
+                    metadatas=[item["metadata"] for item in items] if plan["has_metadata"] else None,
+                    chunk_size=req.chunk_size,
+                    refresh=req.refresh,
+                )
+        if result["indexed"]:
+            ac.invalidate()
+        message = f"{plan['documents']} documents added"
+        if chunking:
+            message += f" as {result['indexed']} chunks"
+        if plan["skipped"]:
+            message += f", {len(plan['skipped'])} already stored"
+        if plan["duplicates"]:
+            message += f", {len(plan['duplicates'])} repeated in the request"
+        return {
+            "message": message + ".",
+            "ids": plan["ids"],
+            "skipped": plan["skipped"],
+            "duplicates": plan["duplicates"],
+            "failed": result["errors"],
+        }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Add failed: {str(e)}")
 
+@router.post("/jobs")
+def submit_ingestion_job(req: DocumentAddRequest):
+    """
+    Ingest documents in the background. Poll /docs/jobs/{job_id} for
+    progress; the document ids are listed there once the job has started.
+    """
+    try:
+        return im.submit(
+            req.texts,
+            req.metadatas,
+            chunking=Config.CHUNKING_ENABLED if req.chunking is None else req.chunking,
+            dedup=Config.INGEST_DEDUP if req.dedup is None else req.dedup,
+            chunk_size=req.chunk_size,
+            refresh=req.refresh,
+            on_done=ac.invalidate,
+        )
+    except IngestionQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to submit ingestion job: {str(e)}")
+
+@router.get("/jobs")
+def list_ingestion_jobs():
+    return {"jobs": im.list()}
+
+@router.get("/jobs/{job_id}")
+def get_ingestion_job(job_id: str):
+    job = im.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.delete("/jobs/{job_id}")
+def cancel_ingestion_job(job_id: str):
+    job = im.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.post("/search-docs")
 def search_documents(req: DocumentSearchRequest):
     try:
-        query_vec = embedding_model.encode(req.query).tolist()
-        body = {
-            "size": req.top_k,
-            "query": {
-                "knn": {
-                    "embedding": {
-                        "vector": query_vec,
-                        "k": req.top_k
-                    }
-                }
-            }
-        }
-        response = osm.client.search(index=INDEX_NAME, body=body)
-        hits = response.get("hits", {}).get("hits", [])
-        results = [{"id": h["_id"], "text": h["_source"]["content"], "score": h["_score"]} for h in hits]
+        query_vec = em.encode(req.query)
+        results = retrieve(req, req.query, query_vec, k=req.top_k)
         return {"results": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
@@ -70,58 +137,151 @@ def search_documents(req: DocumentSearchRequest):
 @router.get("/get-doc/{doc_id}")
 def get_document(doc_id: str):
     try:
-        if not osm.client.exists(index=INDEX_NAME, id=doc_id):
-            raise HTTPException(status_code=404, detail="Document not found")
-        doc = osm.client.get(index=INDEX_NAME, id=doc_id)
-        return {"id": doc["_id"], "content": doc["_source"]["content"]}
+        doc = get_parents([doc_id])[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch document: {str(e)}")
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"id": doc["id"], "content": doc["text"], "metadata": doc["metadata"]}
+
+@router.post("/get-docs")
+def get_documents(req: DocumentIdsRequest):
+    try:
+        docs = get_parents(req.ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch documents: {str(e)}")
+    return {
+        "documents": [
+            {"id": doc["id"], "content": doc["text"], "metadata": doc["metadata"]}
+            for doc in docs if doc is not None
+        ],
+        "missing": [doc_id for doc_id, doc in zip(req.ids, docs) if doc is None],
+    }
 
 @router.delete("/delete-doc/{doc_id}")
 def delete_document(doc_id: str):
     try:
-        if not osm.client.exists(index=INDEX_NAME, id=doc_id):
-            raise HTTPException(status_code=404, detail="Document not found")
-        osm.client.delete(index=INDEX_NAME, id=doc_id)
-        return {"message": f"Document {doc_id} deleted."}
+        result = _delete_documents([doc_id], refresh=True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
+    if result["not_found"]:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if result["errors"]:
+        raise HTTPException(status_code=500, detail=f"Delete failed: {result['errors'][0]['error']}")
+    return {"message": f"Document {doc_id} deleted."}
+
+@router.post("/delete-docs")
+def delete_documents(req: DocumentIdsRequest):
+    try:
+        result = _delete_documents(req.ids, refresh=req.refresh)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
+    return {"message": f"{len(result['deleted'])} documents deleted.", **result}
+
+def _delete_documents(doc_ids: List[str], refresh: bool) -> dict:
+    """
+    Delete documents by id with bulk requests. Ids that are not stored
+    directly are looked up as chunked parents (`<doc_id>:<n>`) and all their
+    chunks are deleted.
+    """
+    if len(doc_ids) == 1:
+        # Common case: one round trip
+        deleted = vs.delete(doc_ids[0])
+        result = {"deleted": doc_ids if deleted else [], "not_found": [] if deleted else doc_ids}
+    else:
+        result = vs.delete_many(doc_ids, refresh=refresh)
+    result = {"deleted": list(result["deleted"]), "not_found": list(result["not_found"]), "errors": list(result.get("errors", []))}
+
+    if result["not_found"]:
+        firsts = vs.get_many([chunk_id(doc_id, 0) for doc_id in result["not_found"]])
+        parents = {first["metadata"]["parent_id"]: first for first in firsts if first is not None}
+        if parents:
+            chunk_result = vs.delete_many([i for first in parents.values() for i in chunk_ids_of(first)], refresh=refresh)
+            result["errors"].extend(chunk_result.get("errors", []))
+            result["deleted"].extend(parents)
+            result["not_found"] = [doc_id for doc_id in result["not_found"] if doc_id not in parents]
+
+    if result["deleted"]:
+        ac.invalidate()
+    return result
 
 @router.delete("/reset-index")
 def reset_index():
+    if getattr(vs, "reindex_status", {}).get("state") == "running":
+        raise HTTPException(status_code=409, detail="A reindex is running; reset the index after it has finished.")
     try:
-        if osm.client.indices.exists(INDEX_NAME):
-            osm.client.indices.delete(index=INDEX_NAME)
-        osm.create_index()
+        vs.reset()
+        ac.invalidate()
         return {"message": "Index reset successfully."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to reset index: {str(e)}")
 
+@router.post("/reindex")
+def start_reindex():
+    """
+    Rebuild the index with the current k-NN settings in the background and
+    swap it in atomically once it is complete.
+    """
+    if not hasattr(vs, "start_reindex"):
+        raise HTTPException(status_code=400, detail="The configured vector backend does not support reindexing.")
+    try:
+        return vs.start_reindex()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start reindex: {str(e)}")
+
+@router.get("/reindex")
+def reindex_status():
+    if not hasattr(vs, "reindex_status"):
+        raise HTTPException(status_code=400, detail="The configured vector backend does not support reindexing.")
+    return vs.reindex_status
+
 @router.get("/list-docs")
-def list_documents(limit: int = 100):
+def list_documents(limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None):
     """
-    List available documents from the index.
+    List documents one page at a time, chunked documents as their whole
+    parent. Pass the returned `next_cursor` to get the following page; it is
+    null after the last page.
     """
 
     try:
-        if not osm.client.indices.exists(INDEX_NAME):
-            raise HTTPException(status_code=404, detail="Index does not exist.")
-
-        response = osm.client.search(
-            index=INDEX_NAME,
-            body={
-                "size": limit,
-                "_source": ["content"],
-                "query": {
-                    "match_all": {}
-                }
-            }
-        )
-        hits = response.get("hits", {}).get("hits", [])
-        docs = [{"id": h["_id"], "text": h["_source"]["content"]} for h in hits]
-        print(f"Docs: {docs}")
-        return {"documents": docs}
+        docs, next_cursor = list_parents(limit, cursor)
+        return {"documents": docs, "next_cursor": next_cursor}
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list documents: {str(e)}")
 
+@router.get("/export")
+def export_documents(batch_size: int = Query(500, ge=1, le=10000)):
+    """
+    Stream every document as NDJSON (`{"id", "text", "metadata"}` per line),
+    chunked documents as their whole parent.
+    """
+    def lines():
+        for doc in iter_parents(batch_size):
+            yield json.dumps(doc, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/embedding-cache")
+def embedding_cache_stats():
+    return em.cache_stats()
+
+@router.post("/embedding-parity")
+def embedding_parity(req: Optional[EmbeddingParityRequest] = None):
+    """
+    Check the configured embedding backend against the PyTorch model.
+    """
+    try:
+        req = req or EmbeddingParityRequest()
+        return em.parity_check(req.texts, min_cosine=req.min_cosine)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Parity check failed: {str(e)}")
+
+@router.get("/rerank-cache")
+def rerank_cache_stats():
+    return rr.stats()
@@ -1,168 +1,267 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import requests
+from typing import List, Optional
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+import httpx
 import json
-import uuid
 import logging
+import profiling
 logger = logging.getLogger()
 
-from external_services import osm
-from sentence_transformers import SentenceTransformer
-
-EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
-INDEX_NAME = osm.index_name
-embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+from external_services import ac, em, om, ss
+from external_services.ollama_manager import OllamaLease, OllamaUnavailable
+from config import Config
+from routers.llm.history import HistoryPolicy
+from routers.retrieval import RetrievalOptions, retrieve
 
 # Create a router instance
 router = APIRouter()
-OLLAMA_URL = "http://ollama:11434/api/chat"
-
-# Store sessions and messages (in-memory, consider a database for persistence)
-# This state is now managed within this router's scope
-sessions = {}
+history_policy = HistoryPolicy(om)
 
 class ChatRequest(BaseModel):
     message: str
     session_id: str = None  # Optional session ID for continued chat
+    stream: bool = False  # Stream tokens back as NDJSON instead of one JSON body
+
+
+def _ndjson(event: dict) -> bytes:
+    return (json.dumps(event) + "\n").encode("utf-8")
+
+def _unavailable(e: OllamaUnavailable) -> HTTPException:
+    headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
+def _append_to_session(session_id: str, messages: List[dict]):
+    # The session can expire or be evicted while Ollama answers; the reply is still returned
+    try:
+        ss.append(session_id, messages)
+    except KeyError:
+        logger.warning(f"Session {session_id} ended before the reply was saved, not recording it.")
+
+async def _streaming_response(messages, on_complete, documents=None) -> StreamingResponse:
+    """
+    Reserve an Ollama backend before the 200 goes out, so overload is still
+    answered with a 429/503, then stream the reply.
+    """
+    try:
+        lease = await om.acquire()
+    except OllamaUnavailable as e:
+        raise _unavailable(e)
+
+    async def release():
+        # No-op unless the stream never started
+        lease.release()
+
+    return StreamingResponse(
+        _stream_reply(messages, on_complete, documents=documents, lease=lease),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(release),
+    )
+
+async def _stream_reply(messages, on_complete, documents=None, lease: Optional[OllamaLease] = None):
+    """
+    Forward Ollama tokens to the client as NDJSON events as they arrive:
+    an optional `documents` event, then `token` events, then a final `done`
+    (or `error`) event. `on_complete` receives the full text once generation
+    finishes so the session history can be written.
+    """
+    if documents is not None:
+        yield _ndjson({"type": "documents", "documents": documents})
+
+    collected_text = ""
+    try:
+        with profiling.span("llm"):
+            async for data in om.stream_chat(messages, lease=lease):
+                token = data.get("message", {}).get("content")
+                if token:
+                    collected_text += token
+                    yield _ndjson({"type": "token", "content": token})
+    except Exception as e:
+        logger.error(f"Error while streaming from Ollama: {e}")
+        yield _ndjson({"type": "error", "detail": f"Could not communicate with Ollama service: {e}"})
+        return
+
+    with profiling.span("session"):
+        await run_in_threadpool(on_complete, collected_text)
+    yield _ndjson({"type": "done", "response": collected_text})
 
 @router.post("/start-chat")
 def start_chat():
     """
     Starts a new chat session and returns a unique session ID.
     """
-    session_id = str(uuid.uuid4())
-    sessions[session_id] = []  # Initialize the session with an empty message history
+    session_id = ss.create()  # Initialize the session with an empty message history
     return {"session_id": session_id}
 
+@router.delete("/end-chat/{session_id}")
+def end_chat(session_id: str):
+    """
+    Deletes a chat session, its history and its cached history summary.
+    """
+    ss.delete(session_id)
+    history_policy.forget(session_id)
+    return {"message": f"Session {session_id} ended."}
+
 @router.post("/chat")
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest):
     """
     Handles sending a message to the Ollama model within a specific session.
     """
     session_id = req.session_id
-    if not session_id or session_id not in sessions:
+    if not session_id or not await run_in_threadpool(ss.exists, session_id):
+        if session_id:
+            # Expired or evicted: its summary is no longer needed
+            history_policy.forget(session_id)
         raise HTTPException(status_code=400, detail="Invalid or missing session ID. Please start a new chat using /llm/start-chat.")
 
     # Add the user's message to the session's message history
-    sessions[session_id].append({"role": "user", "content": req.message})
+    with profiling.span("session"):
+        await run_in_threadpool(ss.append, session_id, [{"role": "user", "content": req.message}])
+        messages = await run_in_threadpool(ss.get_messages, session_id)
+    # Only send the recent window (plus an optional summary of older turns)
+    with profiling.span("history"):
+        messages = await history_policy.build(session_id, messages)
 
-    # Prepare the payload with the session's message history
-    payload = {
-        "model": "llama3",  # change this to your model name if needed
-        "messages": sessions[session_id],
-        "stream": True # Keep streaming enabled
-    }
+    def save_reply(collected_text):
+        if collected_text:
+            _append_to_session(session_id, [{"role": "assistant", "content": collected_text}])
+
+    if req.stream:
+        return await _streaming_response(messages, save_reply)
 
-    collected_text = ""
     try:
-        # Send request to Ollama and process the streaming response
-        response = requests.post(OLLAMA_URL, json=payload, stream=True, timeout=60) # Added timeout
-        response.raise_for_status() # Check for HTTP errors
-
-        for line in response.iter_lines():
-            if line:
-                try:
-                    data = json.loads(line.decode('utf-8'))
-                    if 'message' in data and 'content' in data['message']:
-                        collected_text += data['message']['content']
-                    # Check if the response indicates completion (structure might vary slightly by model/Ollama version)
-                    if data.get('done', False):
-                         # Optional: You might want to capture final context or metrics here if available
-                        break
-                except json.JSONDecodeError:
-                    print(f"Warning: Could not decode JSON line: {line}") # Log decoding errors
-                except Exception as e:
-                    print(f"Error processing stream line: {e}") # Log other processing errors
-
-
-    except requests.exceptions.RequestException as e:
+        # Send the session's message history to Ollama over the pooled client
+        with profiling.span("llm"):
+            collected_text = await om.chat(messages)
+    except OllamaUnavailable as e:
+        raise _unavailable(e)
+    except httpx.HTTPError as e:
         # Log the error and return an informative HTTP exception
-        print(f"Error communicating with Ollama: {e}")
+        logger.error(f"Error communicating with Ollama: {e}")
         raise HTTPException(status_code=503, detail=f"Could not communicate with Ollama service: {e}")
     except Exception as e:
         # Catch unexpected errors during streaming/processing
-        print(f"Unexpected error during chat processing: {e}")
+        logger.error(f"Unexpected error during chat processing: {e}")
         raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
 
 
     # Add assistant's complete response to the message history only if successful
     if collected_text:
-         sessions[session_id].append({"role": "assistant", "content": collected_text})
+        with profiling.span("session"):
+            await run_in_threadpool(save_reply, collected_text)
     else:
         # Handle cases where Ollama might not have responded with content
-        # You might want to return an error or a specific message
-        print(f"Warning: No content received from Ollama for session {session_id}")
-        # Optionally raise an exception or return a specific response
-        # raise HTTPException(status_code=500, detail="No response content received from Ollama.")
+        logger.warning(f"No content received from Ollama for session {session_id}")
         return {"response": "[No content received from model]"}
 
 
     # Return the complete response
     return {"response": collected_text}
 
-class RAGChatRequest(BaseModel):
+def build_rag_messages(question: str, context_chunks: List[str]) -> List[dict]:
+    documents_formatted = "\n".join(f"- {doc}" for doc in context_chunks)
+    system_prompt = (
+        "You are a helpful assistant. Try to use the information from the documents below together with your knowledge to answer the question. Do not try to combine all documents — only use the ones that are clearly relevant to the question.\n\n"
+        f"### Documents:\n{documents_formatted}\n\n"
+        f"### Question:\n{question}\n\n### Answer:"
+    )
+    return [{"role": "system", "content": system_prompt}]
+
+class RAGChatRequest(RetrievalOptions):
     message: str
     session_id: str = None
     top_k: int = 3  # Number of similar docs to retrieve
+    stream: bool = False  # Stream documents and tokens back as NDJSON
+    use_cache: Optional[bool] = None  # Reuse answers to near-identical questions (default: ANSWER_CACHE_ENABLED)
 
 
 @router.post("/rag-chat")
-def rag_chat(req: RAGChatRequest):
+async def rag_chat(req: RAGChatRequest):
     session_id = req.session_id
-    if not session_id or session_id not in sessions:
+    if not session_id or not await run_in_threadpool(ss.exists, session_id):
         raise HTTPException(status_code=400, detail="Invalid or missing session ID. Please start a new chat using /llm/start-chat.")
 
     # Step 1: Embed the query
-    query_vec = embedding_model.encode(req.message).tolist()
+    query_vec = await em.aencode(req.message)
+
+    use_cache = Config.ANSWER_CACHE_ENABLED if req.use_cache is None else req.use_cache
+    cache_generation = ac.generation
+    # Answers are only reused for the same top_k and retrieval options
+    cache_fingerprint = json.dumps(req.model_dump(exclude={"message", "session_id", "stream", "use_cache"}), sort_keys=True)
+    if use_cache:
+        with profiling.span("answer_cache"):
+            cached = ac.lookup(query_vec, fingerprint=cache_fingerprint)
+        if cached is not None:
+            return await _cached_reply(req, cached)
 
     # Step 2: Retrieve top-k relevant documents
     try:
-        response = osm.search(query=req.message, k=req.top_k)
-        context_chunks = [doc for doc, score in response]
+        response = await run_in_threadpool(retrieve, req, req.message, query_vec, req.top_k)
+        context_chunks = [doc["text"] for doc in response]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"RAG retrieval failed: {e}")
 
     # Step 3: Prepare prompt with structured format
-    documents_formatted = "\n".join(f"- {doc}" for doc in context_chunks)
-    system_prompt = (
-        "You are a helpful assistant. Try to use the information from the documents below together with your knowledge to answer the question. Do not try to combine all documents — only use the ones that are clearly relevant to the question.\n\n"
-        f"### Documents:\n{documents_formatted}\n\n"
-        f"### Question:\n{req.message}\n\n### Answer:"
-    )
-
-    # Build conversation history
-    messages = [{"role": "system", "content": system_prompt}]
+    with profiling.span("prompt"):
+        messages = build_rag_messages(req.message, context_chunks)
     logger.warning(f"RAG chat messages: {messages}")
 
+    def save_reply(collected_text):
+        _append_to_session(session_id, [
+            {"role": "user", "content": req.message},
+            {"role": "assistant", "content": collected_text},
+        ])
+        if use_cache and collected_text.strip():
+            ac.store(query_vec, collected_text.strip(), context_chunks, generation=cache_generation, fingerprint=cache_fingerprint)
+
     # Step 4: Send to Ollama
-    payload = {
-        "model": "llama3",
-        "messages": messages,
-        "stream": True
-    }
+    if req.stream:
+        return await _streaming_response(messages, save_reply, documents=context_chunks)
 
-    collected_text = ""
     try:
-        response = requests.post(OLLAMA_URL, json=payload, stream=True, timeout=60)
-        response.raise_for_status()
-        for line in response.iter_lines():
-            if line:
-                try:
-                    data = json.loads(line.decode('utf-8'))
-                    if 'message' in data and 'content' in data['message']:
-                        collected_text += data['message']['content']
-                    if data.get('done', False):
-                        break
-                except Exception:
-                    continue
+        with profiling.span("llm"):
+            collected_text = await om.chat(messages)
+    except OllamaUnavailable as e:
+        raise _unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ollama call failed: {e}")
 
     # Save and return
-    sessions[session_id].append({"role": "user", "content": req.message})
-    sessions[session_id].append({"role": "assistant", "content": collected_text})
+    with profiling.span("session"):
+        await run_in_threadpool(save_reply, collected_text)
 
     return {
         "response": collected_text.strip(),
         "documents": context_chunks
     }
+
+async def _cached_reply(req: RAGChatRequest, cached: dict):
+    logger.info(f"Answer cache hit (similarity={cached['similarity']:.3f}) for session {req.session_id}")
+    await run_in_threadpool(ss.append, req.session_id, [
+        {"role": "user", "content": req.message},
+        {"role": "assistant", "content": cached["response"]},
+    ])
+    if req.stream:
+        async def replay():
+            yield _ndjson({"type": "documents", "documents": cached["documents"]})
+            yield _ndjson({"type": "token", "content": cached["response"]})
+            yield _ndjson({"type": "done", "response": cached["response"], "cached": True})
+        return StreamingResponse(replay(), media_type="application/x-ndjson")
+    return {
+        "response": cached["response"],
+        "documents": cached["documents"],
+        "cached": True
+    }
+
+@router.get("/answer-cache")
+def answer_cache_stats():
+    return ac.stats()
+
+@router.get("/backends")
+def ollama_backends():
+    """
+    Ollama pool status: health and chats in flight per backend, queue depth.
+    """
+    return om.status()
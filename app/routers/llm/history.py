@@ -0,0 +1,127 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List
+
+from config import Config
+
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Summarized messages are recognized by the fingerprint of their last few
+SUMMARY_ANCHOR_MESSAGES = 8
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below in a few sentences. Keep names, facts, "
+    "decisions and open questions; drop small talk.\n\n"
+)
+
+@lru_cache(maxsize=Config.HISTORY_TOKEN_CACHE_SIZE)
+def count_tokens(text: str) -> int:
+    """
+    Cheap token estimate: words and punctuation marks. Cached per message
+    content, so each message is only counted once across turns.
+    """
+    return len(TOKEN_PATTERN.findall(text))
+
+
+class HistoryPolicy:
+    """
+    Chooses which part of a session's history is sent to Ollama: the most
+    recent `max_turns` turns (user + assistant pairs) that fit in
+    `token_budget` tokens. With `summarize`, older messages are rolled into
+    a running summary that is cached per session and only recomputed when
+    the window moves.
+    """
+
+    def __init__(
+        self,
+        ollama,
+        max_turns: int = Config.HISTORY_MAX_TURNS,
+        token_budget: int = Config.HISTORY_TOKEN_BUDGET,
+        summarize: bool = Config.HISTORY_SUMMARIZE,
+        max_cached_summaries: int = Config.HISTORY_SUMMARY_CACHE_SIZE,
+    ):
+        self.ollama = ollama
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.summarize = summarize
+        self.max_cached_summaries = max_cached_summaries
+        # session_id -> (number of summarized messages, fingerprint of their last few, summary)
+        self._summaries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def window_start(self, messages: List[dict]) -> int:
+        """
+        Index of the first message to keep. The latest message is always kept.
+        """
+        if not messages:
+            return 0
+        start = len(messages) - 1
+        tokens = count_tokens(messages[start]["content"])
+        max_messages = max(1, 2 * self.max_turns)
+        while start > 0 and len(messages) - start < max_messages:
+            tokens += count_tokens(messages[start - 1]["content"])
+            if tokens > self.token_budget:
+                break
+            start -= 1
+        return start
+
+    async def build(self, session_id: str, messages: List[dict]) -> List[dict]:
+        start = self.window_start(messages)
+        window = messages[start:]
+        if start == 0 or not self.summarize:
+            return window
+
+        summary = await self._summary(session_id, messages[:start])
+        if not summary:
+            return window
+        return [{"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}] + window
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._summaries.pop(session_id, None)
+
+    async def _summary(self, session_id: str, older: List[dict]) -> str:
+        with self._lock:
+            cached = self._summaries.get(session_id)
+            if cached is not None:
+                self._summaries.move_to_end(session_id)
+
+        # Only summarize what rolled out of the window since the cached summary.
+        # The summarized messages are normally the first `count`; when the
+        # store trimmed the oldest messages they moved towards the front.
+        previous_summary = ""
+        new_messages = older
+        if cached is not None:
+            count, anchor, summary = cached
+            for end in range(min(count, len(older)), 0, -1):
+                if _anchor(older, end) == anchor:
+                    if end == len(older):
+                        return summary
+                    previous_summary, new_messages = summary, older[end:]
+                    break
+
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in new_messages)
+        if previous_summary:
+            transcript = f"Earlier summary: {previous_summary}\n{transcript}"
+        try:
+            summary = (await self.ollama.chat([{"role": "user", "content": SUMMARY_PROMPT + transcript}])).strip()
+        except Exception as e:
+            logger.warning(f"Could not summarize history for session {session_id}, truncating instead: {e}")
+            return previous_summary
+
+        with self._lock:
+            self._summaries[session_id] = (len(older), _anchor(older, len(older)), summary)
+            self._summaries.move_to_end(session_id)
+            while len(self._summaries) > self.max_cached_summaries:
+                self._summaries.popitem(last=False)
+        return summary
+
+
+def _anchor(messages: List[dict], end: int) -> int:
+    return hash(tuple((m["role"], m["content"]) for m in messages[max(0, end - SUMMARY_ANCHOR_MESSAGES):end]))
@@ -0,0 +1,146 @@
+from contextlib import closing
+from pydantic import BaseModel, Field
+from typing import Iterator, List, Literal, Optional, Tuple
+import metrics
+import profiling
+from config import Config
+from external_services import rr, vs
+from external_services.chunker import chunk_id, chunk_ids_of, join_chunks, parent_id_of, strip_chunk_metadata
+
+
+class RetrievalOptions(BaseModel):
+    """
+    Per-request retrieval settings shared by /docs/search-docs and
+    /llm/rag-chat. Unset fields fall back to the RETRIEVAL_*/HYBRID_* config.
+    """
+    mode: Optional[Literal["vector", "hybrid"]] = None
+    fusion: Optional[Literal["rrf", "weighted"]] = None
+    lexical_weight: Optional[float] = Field(None, ge=0)
+    vector_weight: Optional[float] = Field(None, ge=0)
+    collapse: Optional[bool] = None  # return whole parent documents instead of chunks
+    rerank: Optional[bool] = None  # rescore candidates with the cross-encoder
+    rerank_candidates: Optional[int] = Field(None, ge=1, le=Config.RERANK_MAX_CANDIDATES)
+
+
+def retrieve(options: RetrievalOptions, query_text: str, query_vector, k: int) -> List[dict]:
+    with metrics.RETRIEVAL_SECONDS.labels("total").time(), profiling.span("retrieval"):
+        try:
+            return _retrieve(options, query_text, query_vector, k)
+        except Exception:
+            metrics.ERRORS.labels("retrieval").inc()
+            raise
+
+
+def _retrieve(options: RetrievalOptions, query_text: str, query_vector, k: int) -> List[dict]:
+    collapse = Config.RETRIEVAL_COLLAPSE_CHUNKS if options.collapse is None else options.collapse
+    if not collapse:
+        return _candidates(options, query_text, query_vector, k)
+
+    # Over-fetch chunks so that k distinct parents survive the grouping
+    parents = {}
+    for doc in _candidates(options, query_text, query_vector, k * Config.CHUNK_COLLAPSE_FACTOR):
+        parent = parents.setdefault(parent_id_of(doc), {"score": doc["score"], "doc": doc, "chunks": []})
+        parent["chunks"].append(doc["id"])
+    ranked = sorted(parents.items(), key=lambda item: item[1]["score"], reverse=True)[:k]
+    docs = fetch_parents([parent["doc"] for _, parent in ranked])
+    return [
+        {**doc, "id": parent_id, "score": parent["score"], "chunks": parent["chunks"]}
+        for doc, (parent_id, parent) in zip(docs, ranked)
+    ]
+
+
+def fetch_parents(docs: List[dict]) -> List[dict]:
+    """
+    Rebuild the parent documents of the given chunks, fetching the chunks
+    they are missing in a single `get_many`.
+    """
+    needed = list(dict.fromkeys(i for doc in docs if len(chunk_ids_of(doc)) > 1 for i in chunk_ids_of(doc)))
+    with metrics.RETRIEVAL_SECONDS.labels("parents").time(), profiling.span("parents"):
+        fetched = dict(zip(needed, vs.get_many(needed))) if needed else {}
+    parents = []
+    for doc in docs:
+        ids = chunk_ids_of(doc)
+        chunks = [doc] if len(ids) == 1 else [fetched[i] for i in ids if fetched.get(i) is not None]
+        parents.append({
+            "id": parent_id_of(doc),
+            "text": join_chunks(chunks or [doc]),
+            "metadata": strip_chunk_metadata((chunks or [doc])[0]["metadata"]),
+        })
+    return parents
+
+
+def get_parents(doc_ids: List[str]) -> List[Optional[dict]]:
+    """
+    Look up documents by id, in at most three round trips: a single-chunk
+    document or a chunk is returned as stored, a chunked parent is rebuilt
+    from its chunks.
+    """
+    docs = vs.get_many(doc_ids)
+    missing = [doc_id for doc_id, doc in zip(doc_ids, docs) if doc is None]
+    if not missing:
+        return docs
+    firsts = [doc for doc in vs.get_many([chunk_id(doc_id, 0) for doc_id in missing]) if doc is not None]
+    parents = {parent["id"]: parent for parent in fetch_parents(firsts)}
+    return [doc if doc is not None else parents.get(doc_id) for doc_id, doc in zip(doc_ids, docs)]
+
+
+def list_parents(limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of parent documents. Chunks are listed through their first
+    chunk, rebuilt into the whole parent; the other chunks are skipped, and
+    further store pages are read until the page is full or the store ends.
+    """
+    parents = []
+    while True:
+        docs, cursor = vs.list_page(limit - len(parents), cursor)
+        parents.extend(fetch_parents([doc for doc in docs if _is_first_chunk(doc)]))
+        if len(parents) >= limit or cursor is None:
+            return parents, cursor
+
+
+def iter_parents(batch_size: int = 500) -> Iterator[dict]:
+    batch = []
+    # Close the store walk (and its cursor) as soon as this generator is closed
+    with closing(vs.iter_documents(batch_size)) as docs:
+        for doc in docs:
+            if _is_first_chunk(doc):
+                batch.append(doc)
+            if len(batch) >= batch_size:
+                yield from fetch_parents(batch)
+                batch = []
+    if batch:
+        yield from fetch_parents(batch)
+
+
+def _is_first_chunk(doc: dict) -> bool:
+    return (doc.get("metadata") or {}).get("chunk_index", 0) == 0
+
+
+def _candidates(options: RetrievalOptions, query_text: str, query_vector, k: int) -> List[dict]:
+    rerank = Config.RERANK_ENABLED if options.rerank is None else options.rerank
+    if not rerank:
+        return _search(options, query_text, query_vector, k)
+    # The cap bounds the cross-encoder work, but never below the k asked for (k is larger when collapsing chunks)
+    candidates = max(k, min(options.rerank_candidates or Config.RERANK_CANDIDATES, Config.RERANK_MAX_CANDIDATES))
+    docs = _search(options, query_text, query_vector, candidates)
+    with metrics.RETRIEVAL_SECONDS.labels("rerank").time(), profiling.span("rerank"):
+        return rr.rerank(query_text, docs, k)
+
+
+def _search(options: RetrievalOptions, query_text: str, query_vector, k: int) -> List[dict]:
+    with metrics.RETRIEVAL_SECONDS.labels("search").time(), profiling.span("search"):
+        return _first_stage(options, query_text, query_vector, k)
+
+
+def _first_stage(options: RetrievalOptions, query_text: str, query_vector, k: int) -> List[dict]:
+    mode = options.mode or Config.RETRIEVAL_MODE
+    if mode == "hybrid":
+        return vs.hybrid_search(
+            query_text,
+            query_vector,
+            k=k,
+            lexical_weight=Config.HYBRID_LEXICAL_WEIGHT if options.lexical_weight is None else options.lexical_weight,
+            vector_weight=Config.HYBRID_VECTOR_WEIGHT if options.vector_weight is None else options.vector_weight,
+            fusion=options.fusion or Config.HYBRID_FUSION,
+        )
+    return vs.search(query_vector, k=k)
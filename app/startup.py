@@ -0,0 +1,57 @@
+"""
+Startup timing and readiness.
+
+`timed` records how long each import and initialization step takes; the
+report is logged once warm-up finishes and served at /startup. /ready
+answers 503 until `mark_ready` is called.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Import of this module is the earliest point we can measure from
+STARTED_AT = time.perf_counter()
+
+steps = []
+ready = threading.Event()
+error = None
+_ready_after = None
+
+
+@contextmanager
+def timed(component: str, phase: str = "init"):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        steps.append({"component": component, "phase": phase, "seconds": round(time.perf_counter() - start, 4)})
+
+
+def mark_ready():
+    global _ready_after
+    _ready_after = time.perf_counter() - STARTED_AT
+    ready.set()
+    log_report()
+
+
+def mark_failed(exc: Exception):
+    global error
+    error = str(exc)
+    logger.error(f"Warm-up failed: {exc}")
+
+
+def report() -> dict:
+    return {
+        "ready": ready.is_set(),
+        "error": error,
+        "ready_after_seconds": round(_ready_after, 4) if _ready_after is not None else None,
+        "steps": steps,
+    }
+
+
+def log_report():
+    lines = [f"  {step['phase']:<7} {step['component']:<28} {step['seconds']:>8.3f}s" for step in steps]
+    logger.info(f"Ready after {_ready_after:.3f}s since startup began:\n" + "\n".join(lines))
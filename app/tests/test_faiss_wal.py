@@ -0,0 +1,147 @@
+import os
+
+import faiss
+import numpy as np
+
+from external_services.faiss_manager import FaissManager
+from external_services.faiss_wal import WriteAheadLog
+
+DIM = 4
+
+
+def make_manager(path) -> FaissManager:
+    manager = FaissManager(
+        vector_dim=DIM,
+        index_path=str(path / "docs.index"),
+        index_factory="Flat",
+        use_mmap=False,
+        use_wal=True,
+        wal_fsync=False,
+        snapshot_interval=0,
+    )
+    manager.connect()
+    return manager
+
+
+def crash(manager: FaissManager):
+    # Stop without a snapshot: only what already reached the log survives
+    manager.wal._file.close()
+    manager.wal._file = None
+
+
+def stored_vectors(manager: FaissManager) -> dict:
+    ids = faiss.vector_to_array(manager.index.id_map).tolist()
+    vectors = manager.index.index.reconstruct_n(0, manager.index.ntotal)
+    return {faiss_id: vectors[row].tolist() for row, faiss_id in enumerate(ids)}
+
+
+def add(manager: FaissManager, names, seed: int):
+    vectors = np.random.default_rng(seed).random((len(names), DIM), dtype=np.float32)
+    manager.add([f"text of {name}" for name in names], ids=list(names), embeddings=vectors, metadatas=[{"name": name} for name in names])
+
+
+def test_replay_drops_torn_record(tmp_path):
+    wal = WriteAheadLog(str(tmp_path / "log"), fsync=False)
+    wal.open(0)
+    wal.append({"op": "a"}, b"\x01\x02")
+    wal.append({"op": "b"})
+    wal.append({"op": "c"}, b"\x03" * 16)
+    wal.close()
+
+    path = wal.segments()[0][1]
+    size = os.path.getsize(path)
+    with open(path, "r+b") as f:
+        f.truncate(size - 5)
+
+    assert [(header["op"], payload) for header, payload in wal.replay(0)] == [("a", b"\x01\x02"), ("b", b"")]
+    # The torn tail is cut off so new records follow the last good one
+    wal.open(0)
+    wal.append({"op": "d"})
+    wal.close()
+    assert [header["op"] for header, _ in wal.replay(0)] == ["a", "b", "d"]
+
+
+def test_replay_drops_corrupt_record(tmp_path):
+    wal = WriteAheadLog(str(tmp_path / "log"), fsync=False)
+    wal.open(0)
+    wal.append({"op": "a"})
+    wal.append({"op": "b"}, b"\x00" * 8)
+    wal.close()
+
+    path = wal.segments()[0][1]
+    with open(path, "r+b") as f:
+        f.seek(-6, os.SEEK_END)
+        f.write(b"\xff")
+
+    assert [header["op"] for header, _ in wal.replay(0)] == ["a"]
+
+
+def test_connect_rebuilds_state_from_log(tmp_path):
+    manager = make_manager(tmp_path)
+    add(manager, ["a", "b", "c"], seed=1)
+    add(manager, ["b"], seed=2)  # overwrite
+    manager.delete("c")
+    docs, vectors = dict(manager.docs), stored_vectors(manager)
+    crash(manager)
+
+    recovered = make_manager(tmp_path)
+    assert recovered.docs == docs
+    assert stored_vectors(recovered) == vectors
+    assert recovered.get("b")["metadata"] == {"name": "b"}
+    assert recovered.get("c") is None
+
+
+def test_connect_after_torn_append(tmp_path):
+    manager = make_manager(tmp_path)
+    add(manager, ["a", "b"], seed=1)
+    docs, vectors = dict(manager.docs), stored_vectors(manager)
+    add(manager, ["c"], seed=2)
+    crash(manager)
+
+    # The last add was only partly written when the process died
+    _, path = manager.wal.segments()[-1]
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 10)
+
+    recovered = make_manager(tmp_path)
+    assert recovered.docs == docs
+    assert stored_vectors(recovered) == vectors
+    # New writes after recovery are replayed too
+    add(recovered, ["d"], seed=3)
+    docs, vectors = dict(recovered.docs), stored_vectors(recovered)
+    crash(recovered)
+    again = make_manager(tmp_path)
+    assert again.docs == docs
+    assert stored_vectors(again) == vectors
+
+
+def test_replay_after_snapshot(tmp_path):
+    manager = make_manager(tmp_path)
+    add(manager, ["a", "b"], seed=1)
+    manager.snapshot(force=True)
+    # The snapshot covers the first segment, which is dropped
+    segments = [number for number, _ in manager.wal.segments()]
+    assert segments == [manager.wal.segment]
+
+    add(manager, ["c"], seed=2)
+    manager.delete("a")
+    docs, vectors = dict(manager.docs), stored_vectors(manager)
+    crash(manager)
+
+    recovered = make_manager(tmp_path)
+    assert recovered.docs == docs
+    assert stored_vectors(recovered) == vectors
+    assert recovered._next_id == manager._next_id
+
+
+def test_clean_shutdown_needs_no_replay(tmp_path):
+    manager = make_manager(tmp_path)
+    add(manager, ["a", "b"], seed=1)
+    manager.snapshot(force=True)
+    docs, vectors = dict(manager.docs), stored_vectors(manager)
+    manager.disconnect()
+
+    recovered = make_manager(tmp_path)
+    assert recovered._ops_since_snapshot == 0
+    assert recovered.docs == docs
+    assert stored_vectors(recovered) == vectors
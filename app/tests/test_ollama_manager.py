@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from external_services.ollama_manager import OllamaManager, OllamaUnavailable
+
+
+class FakeOllama:
+    """
+    Transport answering `/api/tags` and `/api/chat` like Ollama, or refusing
+    connections while `down` is set.
+    """
+
+    def __init__(self):
+        self.down = False
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if self.down:
+            raise httpx.ConnectError("connection refused", request=request)
+        if request.url.path == "/api/tags":
+            return httpx.Response(200, json={"models": []})
+        return httpx.Response(200, text='{"message": {"content": "hi"}, "done": true}\n')
+
+
+def make_manager(server: FakeOllama, **kwargs) -> OllamaManager:
+    manager = OllamaManager(urls=["http://ollama-a:11434"], health_interval=0, max_failures=1, **kwargs)
+    asyncio.run(manager.connect())
+    for backend in manager.backends:
+        backend.client = httpx.AsyncClient(base_url=backend.url, transport=httpx.MockTransport(server))
+    return manager
+
+
+def test_ejected_backend_recovers_without_health_loop():
+    server = FakeOllama()
+    manager = make_manager(server, eject_cooldown=0.05)
+    backend = manager.backends[0]
+
+    async def scenario():
+        server.down = True
+        with pytest.raises(httpx.ConnectError):
+            await manager.chat([{"role": "user", "content": "hello"}])
+        assert not backend.healthy
+
+        # Still in its cool-down: no probe, the pool stays empty
+        server.down = False
+        with pytest.raises(OllamaUnavailable) as error:
+            await manager.acquire()
+        assert error.value.status_code == 503
+
+        await asyncio.sleep(0.06)
+        assert await manager.chat([{"role": "user", "content": "hello"}]) == "hi"
+        assert backend.healthy
+        assert backend.failures == 0
+
+    asyncio.run(scenario())
+
+
+def test_failed_probe_waits_for_another_cooldown():
+    server = FakeOllama()
+    manager = make_manager(server, eject_cooldown=0.05)
+    backend = manager.backends[0]
+
+    async def scenario():
+        server.down = True
+        with pytest.raises(httpx.ConnectError):
+            await manager.chat([{"role": "user", "content": "hello"}])
+
+        await asyncio.sleep(0.06)
+        with pytest.raises(OllamaUnavailable):
+            await manager.acquire()
+        assert not backend.healthy
+        assert backend.probe_at > time.monotonic()
+
+    asyncio.run(scenario())
@@ -0,0 +1,68 @@
+"""
+Compare two benchmark result files (micro or load) and flag regressions.
+
+    python benchmarks/compare.py results/load-old.json results/load-new.json --threshold 10
+
+Exits with status 1 when any latency percentile got worse, or throughput
+dropped, by more than `--threshold` percent.
+"""
+import argparse
+import json
+import sys
+
+LOWER_IS_BETTER = ("mean", "p50", "p95", "p99")
+
+
+def flatten(results: dict) -> dict:
+    """
+    `{metric path: value}` for every number we compare, e.g.
+    `chat.ttft_ms.p95` or `embed.single.cached.p50`.
+    """
+    rows = {}
+    groups = results.get("scenarios") or results.get("benchmarks") or {}
+    for name, data in groups.items():
+        for key, value in data.items():
+            if isinstance(value, dict):
+                for stat in LOWER_IS_BETTER:
+                    if stat in value:
+                        rows[f"{name}.{key}.{stat}"] = (value[stat], False)
+            elif key in LOWER_IS_BETTER:
+                # A micro-benchmark row is a flat summary
+                rows[f"{name}.{key}"] = (value, name.endswith("per_second"))
+            elif key == "rps":
+                rows[f"{name}.rps"] = (value, True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed change in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    if baseline["kind"] != candidate["kind"]:
+        sys.exit(f"Cannot compare {baseline['kind']} results with {candidate['kind']} results")
+
+    old, new = flatten(baseline["results"]), flatten(candidate["results"])
+    regressions = 0
+    print(f"{'metric':<48}{'baseline':>12}{'candidate':>12}{'change':>10}")
+    for metric in sorted(old.keys() & new.keys()):
+        (before, higher_is_better), (after, _) = old[metric], new[metric]
+        change = (after - before) / before * 100 if before else 0.0
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > args.threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{metric:<48}{before:>12}{after:>12}{change:>+9.1f}%{flag}")
+    print(f"\n{regressions} regressions (threshold {args.threshold}%)")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
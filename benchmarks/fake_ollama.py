@@ -0,0 +1,74 @@
+"""
+Stand-in for the Ollama chat API: streams NDJSON tokens at a fixed rate after
+a configurable prefill delay, so load tests measure this service rather than
+the model.
+
+    python benchmarks/fake_ollama.py --port 11435 --tokens-per-second 50 --ttft-ms 200
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+def create_app(tokens: int, tokens_per_second: float, ttft_ms: float) -> FastAPI:
+    app = FastAPI()
+    interval = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+
+    def message(content: str, done: bool, model: str, **extra) -> str:
+        return json.dumps({
+            "model": model,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+            **extra,
+        }) + "\n"
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+
+        async def stream():
+            await asyncio.sleep(ttft_ms / 1000.0)
+            for i in range(tokens):
+                yield message(f"tok{i} ", False, model)
+                if interval:
+                    await asyncio.sleep(interval)
+            yield message(
+                "", True, model, done_reason="stop",
+                prompt_eval_count=prompt_chars // 4, prompt_eval_duration=int(ttft_ms * 1e6),
+                eval_count=tokens, eval_duration=int(tokens * interval * 1e9),
+            )
+
+        if body.get("stream", True):
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+        await asyncio.sleep(ttft_ms / 1000.0 + tokens * interval)
+        return json.loads(message("".join(f"tok{i} " for i in range(tokens)), True, model))
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "fake"}]}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens", type=int, default=64, help="tokens per reply")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="0 streams as fast as possible")
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="delay before the first token (prefill)")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(args.tokens, args.tokens_per_second, args.ttft_ms), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
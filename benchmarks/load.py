@@ -0,0 +1,242 @@
+"""
+Concurrent load driver for the API. For each scenario it reports latency
+percentiles, time to first token (streaming chat endpoints) and requests per
+second, and saves the results as JSON for comparison with compare.py.
+
+Against a running service:
+
+    python benchmarks/load.py --url http://localhost:8000 --concurrency 16 --requests 200
+
+Or self-contained, starting the fake Ollama server and the API on the FAISS
+backend in a temporary directory:
+
+    python benchmarks/load.py --start-local --tokens-per-second 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from micro import synthetic_text
+from stats import print_table, save_results, summarize
+
+SCENARIOS = ("search-docs", "add-docs", "chat", "rag-chat")
+
+
+class Scenario:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = []
+        self.ttfts = []
+        self.errors = 0
+        self.error_samples = []
+
+    def record_error(self, error: str):
+        self.errors += 1
+        if len(self.error_samples) < 5:
+            self.error_samples.append(error)
+
+    def result(self, elapsed: float) -> dict:
+        completed = len(self.latencies)
+        result = {
+            "latency_ms": summarize(self.latencies),
+            "requests": completed + self.errors,
+            "errors": self.errors,
+            "rps": round(completed / elapsed, 2) if elapsed > 0 else 0.0,
+            "elapsed_seconds": round(elapsed, 3),
+        }
+        if self.ttfts:
+            result["ttft_ms"] = summarize(self.ttfts)
+        if self.error_samples:
+            result["error_samples"] = self.error_samples
+        return result
+
+
+async def call(client: httpx.AsyncClient, scenario: Scenario, path: str, payload: dict, stream: bool = False):
+    start = time.perf_counter()
+    try:
+        if not stream:
+            response = await client.post(path, json=payload)
+            response.raise_for_status()
+        else:
+            first_token = None
+            async with client.stream("POST", path, json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event.get("type") == "token" and first_token is None:
+                        first_token = time.perf_counter() - start
+                    elif event.get("type") == "error":
+                        raise RuntimeError(event.get("detail"))
+            if first_token is not None:
+                scenario.ttfts.append(first_token)
+        scenario.latencies.append(time.perf_counter() - start)
+    except Exception as e:
+        scenario.record_error(f"{type(e).__name__}: {e}")
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, args) -> dict:
+    scenario = Scenario(name)
+    counter = iter(range(args.requests))
+    rng = random.Random(args.seed)
+
+    async def worker(worker_id: int):
+        session_id = None
+        if name in ("chat", "rag-chat"):
+            response = await client.post("/llm/start-chat")
+            response.raise_for_status()
+            session_id = response.json()["session_id"]
+        for i in counter:
+            if name == "search-docs":
+                payload = {"query": synthetic_text(rng.randrange(10**6), words=8), "top_k": args.top_k}
+                await call(client, scenario, "/docs/search-docs", payload)
+            elif name == "add-docs":
+                texts = [synthetic_text(args.seed * 10**7 + i * args.add_batch + j) for j in range(args.add_batch)]
+                await call(client, scenario, "/docs/add-docs", {"texts": texts, "refresh": False})
+            elif name == "chat":
+                payload = {"message": f"Question {i} from worker {worker_id}?", "session_id": session_id, "stream": not args.no_stream}
+                await call(client, scenario, "/llm/chat", payload, stream=not args.no_stream)
+            elif name == "rag-chat":
+                payload = {
+                    "message": synthetic_text(rng.randrange(10**6), words=8) + "?",
+                    "session_id": session_id,
+                    "top_k": args.top_k,
+                    "stream": not args.no_stream,
+                    "use_cache": False,
+                }
+                await call(client, scenario, "/llm/rag-chat", payload, stream=not args.no_stream)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(args.concurrency)))
+    return scenario.result(time.perf_counter() - start)
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        if args.seed_docs:
+            print(f"Seeding {args.seed_docs} documents...")
+            for start in range(0, args.seed_docs, 500):
+                texts = [synthetic_text(i) for i in range(start, min(start + 500, args.seed_docs))]
+                (await client.post("/docs/add-docs", json={"texts": texts}, timeout=600)).raise_for_status()
+
+        results = {}
+        for name in args.scenarios:
+            print(f"Running {name}: {args.requests} requests, concurrency {args.concurrency}...")
+            results[name] = await run_scenario(client, name, args)
+        return results
+
+
+def wait_ready(url: str, timeout: float, processes=()):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for process in processes:
+            if process.poll() is not None:
+                raise RuntimeError(f"{' '.join(process.args)} exited with status {process.returncode}")
+        try:
+            if httpx.get(f"{url}/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} was not ready after {timeout}s")
+
+
+@contextmanager
+def local_stack(args):
+    """
+    Fake Ollama plus the API (FAISS backend, fresh temporary index) as
+    subprocesses; yields the API base URL.
+    """
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    app_dir = os.path.join(HERE, "..", "app")
+    ollama = subprocess.Popen([
+        sys.executable, os.path.join(HERE, "fake_ollama.py"),
+        "--port", str(args.ollama_port),
+        "--tokens", str(args.tokens),
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--ttft-ms", str(args.ttft_ms),
+    ])
+    env = {
+        **os.environ,
+        "OLLAMA_URL": f"http://127.0.0.1:{args.ollama_port}",
+        "VECTOR_BACKEND": "faiss",
+        "FAISS_INDEX_PATH": os.path.join(workdir, "faiss.index"),
+        "SESSION_BACKEND": "memory",
+    }
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.api_port), "--log-level", "warning"],
+        cwd=app_dir,
+        env=env,
+    )
+    url = f"http://127.0.0.1:{args.api_port}"
+    try:
+        wait_ready(url, args.startup_timeout, processes=(api, ollama))
+        yield url
+    finally:
+        for process in (api, ollama):
+            process.terminate()
+            process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--add-batch", type=int, default=10, help="texts per add-docs request")
+    parser.add_argument("--seed-docs", type=int, default=1000, help="documents added before the scenarios run")
+    parser.add_argument("--no-stream", action="store_true", help="use non-streaming chat (no TTFT)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--start-local", action="store_true", help="start fake Ollama and the API locally")
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--ollama-port", type=int, default=11435)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--ttft-ms", type=float, default=200.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--out-dir", default=os.path.join(HERE, "results"))
+    parser.add_argument("--output", help="result file (default: <out-dir>/load-<time>.json)")
+    args = parser.parse_args()
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    if args.start_local:
+        with local_stack(args) as url:
+            args.url = url
+            results = asyncio.run(run(args))
+    else:
+        results = asyncio.run(run(args))
+
+    rows = {}
+    for name, result in results.items():
+        rows[f"{name} latency (ms)"] = result["latency_ms"]
+        if "ttft_ms" in result:
+            rows[f"{name} ttft (ms)"] = result["ttft_ms"]
+    print_table(rows)
+    for name, result in results.items():
+        print(f"{name}: {result['rps']} req/s, {result['errors']} errors")
+    path = save_results("load", {"config": vars(args), "scenarios": results}, args.out_dir, args.output)
+    print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Micro-benchmarks of the request hot path, run in-process against the FAISS
+backend (a stand-in for OpenSearch) in a temporary directory:
+
+- embedding: single uncached text, single cached text, batch of 32
+- retrieval: raw vector search and the `retrieve` pipeline used by the routers
+- prompt assembly: building and serializing the rag-chat request to Ollama
+
+    python benchmarks/micro.py --docs 5000 --iterations 200
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "app"))
+
+from stats import print_table, save_results, summarize
+
+WORDS = (
+    "vector search index document query model embedding latency cache token prompt answer "
+    "cluster shard replica batch stream chat session history retrieval ranking score"
+).split()
+
+
+def synthetic_text(i: int, words: int = 60) -> str:
+    return " ".join(WORDS[(i * 7 + j * 13) % len(WORDS)] for j in range(words)) + f" ({i})"
+
+
+def bench(fn, iterations: int, warmup: int = 5) -> dict:
+    for i in range(warmup):
+        fn(-1 - i)
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000, help="documents indexed for the retrieval benchmarks")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--index-factory", default="Flat", help="FAISS index type, e.g. HNSW32")
+    parser.add_argument("--out-dir", default=os.path.join(HERE, "results"))
+    parser.add_argument("--output", help="result file (default: <out-dir>/micro-<time>.json)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    os.environ.update({
+        "VECTOR_BACKEND": "faiss",
+        "FAISS_INDEX_PATH": os.path.join(workdir, "faiss.index"),
+        "FAISS_INDEX_FACTORY": args.index_factory,
+        "FAISS_WAL": "false",
+        "FAISS_SNAPSHOT_INTERVAL": "0",
+        "EMBEDDING_CACHE_PATH": "",
+    })
+
+    from external_services import em, vs
+    from routers.llm.chat import build_rag_messages
+    from routers.retrieval import RetrievalOptions, retrieve
+
+    vs.connect()
+    em.start()
+    results = {}
+    try:
+        em.load()
+        results["embed.single.uncached"] = bench(lambda i: em.encode(f"uncached query number {i} {time.perf_counter()}"), args.iterations)
+        em.encode("a cached query")
+        results["embed.single.cached"] = bench(lambda i: em.encode("a cached query"), args.iterations)
+        results["embed.batch32.uncached"] = bench(
+            lambda i: em.encode([f"batch {i} item {j} {time.perf_counter()}" for j in range(32)]),
+            max(1, args.iterations // 10),
+            warmup=1,
+        )
+
+        start = time.perf_counter()
+        texts = [synthetic_text(i) for i in range(args.docs)]
+        vs.add(texts, ids=[str(i) for i in range(args.docs)])
+        results["ingest.docs_per_second"] = {"count": args.docs, "mean": round(args.docs / (time.perf_counter() - start), 1)}
+
+        queries = [synthetic_text(i * 31 + 5, words=8) for i in range(args.iterations + 10)]
+        vectors = em.encode(queries)
+        options = RetrievalOptions()
+        results["retrieval.vector_search"] = bench(lambda i: vs.search(vectors[i], k=args.top_k), args.iterations)
+        results["retrieval.pipeline"] = bench(lambda i: retrieve(options, queries[i], vectors[i], args.top_k), args.iterations)
+
+        context = [doc["text"] for doc in vs.search(vectors[0], k=args.top_k)]
+        results["prompt.assembly"] = bench(
+            lambda i: json.dumps({"model": "llama3", "messages": build_rag_messages(queries[i], context), "stream": True}),
+            args.iterations,
+        )
+    finally:
+        em.stop()
+        vs.disconnect()
+
+    print_table(results)
+    path = save_results("micro", {"config": vars(args), "benchmarks": results}, args.out_dir, args.output)
+    print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
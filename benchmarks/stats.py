@@ -0,0 +1,57 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def summarize(samples: List[float], unit_scale: float = 1000.0) -> Dict[str, float]:
+    """
+    Latency summary of `samples` (seconds), reported in milliseconds.
+    """
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples, dtype=np.float64) * unit_scale
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save_results(kind: str, results: dict, out_dir: str, path: Optional[str] = None) -> str:
+    """
+    Write `results` with the run environment to `<out_dir>/<kind>-<time>.json`
+    (or `path`) and return the file name.
+    """
+    path = path or os.path.join(out_dir, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"kind": kind, "environment": environment(), "results": results}, f, indent=2)
+    return path
+
+
+def print_table(results: Dict[str, dict], columns=("count", "mean", "p50", "p95", "p99")):
+    print(f"{'':<32}" + "".join(f"{c:>10}" for c in columns))
+    for name, row in results.items():
+        print(f"{name:<32}" + "".join(f"{row.get(c, ''):>10}" for c in columns))
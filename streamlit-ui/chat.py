@@ -1,8 +1,43 @@
 import streamlit as st
 import requests
+import json
 
 FASTAPI_URL = "http://fastapi:8000"
 
+def render_message(role, content):
+    align = "flex-end" if role == "user" else "flex-start"
+    bg_color = "#1f1919" if role == "user" else "#1f1919"
+    return (
+        f'<div style="display: flex; justify-content: {align}; margin-bottom: 10px;">'
+        f'<div style="background-color: {bg_color}; padding: 10px; border-radius: 5px; max-width: 70%;">'
+        f'{content}</div></div>'
+    )
+
+def stream_reply(url, payload, placeholder):
+    """
+    POST with `stream: True` and render the assistant reply into `placeholder`
+    token by token. Returns the full reply and any retrieved documents.
+    """
+    collected_text = ""
+    documents = []
+    with requests.post(url, json={**payload, "stream": True}, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line.decode("utf-8"))
+            if event["type"] == "documents":
+                documents = event["documents"]
+            elif event["type"] == "token":
+                collected_text += event["content"]
+                placeholder.markdown(render_message("assistant", collected_text + "▌"), unsafe_allow_html=True)
+            elif event["type"] == "error":
+                raise RuntimeError(event["detail"])
+            elif event["type"] == "done":
+                collected_text = event["response"]
+    placeholder.markdown(render_message("assistant", collected_text), unsafe_allow_html=True)
+    return collected_text, documents
+
 def chat_section():
     if "session_id" not in st.session_state:
         st.session_state.session_id = None
@@ -10,6 +45,8 @@ def chat_section():
         st.session_state.chat_history = []
     if "user_input" not in st.session_state:
         st.session_state.user_input = ""
+    if "pending_message" not in st.session_state:
+        st.session_state.pending_message = None
 
     def start_new_chat():
         try:
@@ -26,18 +63,10 @@ def chat_section():
             st.session_state.chat_history = []
 
     def send_message():
+        # The reply is streamed while the page renders, below the history
         if st.session_state.session_id and st.session_state.user_input:
-            message = st.session_state.user_input
-            try:
-                payload = {"message": message, "session_id": st.session_state.session_id}
-                response = requests.post(f"{FASTAPI_URL}/llm/chat", json=payload)
-                response.raise_for_status()
-                data = response.json()
-                st.session_state.chat_history.append({"role": "user", "content": message})
-                st.session_state.chat_history.append({"role": "assistant", "content": data["response"]})
-                st.session_state.user_input = ""
-            except Exception as e:
-                st.error(f"Error sending message: {e}")
+            st.session_state.pending_message = st.session_state.user_input
+            st.session_state.user_input = ""
 
     st.title("Ollama Chatbot")
 
@@ -50,13 +79,20 @@ def chat_section():
     if st.session_state.chat_history:
         with st.session_state.response_container:
             for msg in st.session_state.chat_history:
-                align = "flex-end" if msg["role"] == "user" else "flex-start"
-                bg_color = "#1f1919" if msg["role"] == "user" else "#1f1919"
-                st.markdown(
-                    f'<div style="display: flex; justify-content: {align}; margin-bottom: 10px;">'
-                    f'<div style="background-color: {bg_color}; padding: 10px; border-radius: 5px; max-width: 70%;">'
-                    f'{msg["content"]}</div></div>', unsafe_allow_html=True
-                )
+                st.markdown(render_message(msg["role"], msg["content"]), unsafe_allow_html=True)
+
+    if st.session_state.pending_message:
+        message = st.session_state.pending_message
+        st.session_state.pending_message = None
+        with st.session_state.response_container:
+            st.markdown(render_message("user", message), unsafe_allow_html=True)
+            try:
+                payload = {"message": message, "session_id": st.session_state.session_id}
+                reply, _ = stream_reply(f"{FASTAPI_URL}/llm/chat", payload, st.empty())
+                st.session_state.chat_history.append({"role": "user", "content": message})
+                st.session_state.chat_history.append({"role": "assistant", "content": reply})
+            except Exception as e:
+                st.error(f"Error sending message: {e}")
 
     st.text_input("Your message:", key="user_input", on_change=send_message)
     st.button("Send", on_click=send_message)
@@ -68,6 +104,8 @@ def rag_chat_section():
         st.session_state.rag_chat_history = []
     if "rag_user_input" not in st.session_state:
         st.session_state.rag_user_input = ""
+    if "rag_pending_message" not in st.session_state:
+        st.session_state.rag_pending_message = None
 
     def start_new_rag_chat():
         try:
@@ -85,22 +123,8 @@ def rag_chat_section():
 
     def send_rag_message():
         if st.session_state.rag_session_id and st.session_state.rag_user_input:
-            message = st.session_state.rag_user_input
-            try:
-                payload = {
-                    "message": message,
-                    "session_id": st.session_state.rag_session_id,
-                    "top_k": 3
-                }
-                response = requests.post(f"{FASTAPI_URL}/llm/rag-chat", json=payload)
-                response.raise_for_status()
-                data = response.json()
-
-                st.session_state.rag_chat_history.append({"role": "user", "content": message})
-                st.session_state.rag_chat_history.append({"role": "assistant", "content": data["response"]})
-                st.session_state.rag_user_input = ""
-            except Exception as e:
-                st.error(f"Error sending RAG message: {e}")
+            st.session_state.rag_pending_message = st.session_state.rag_user_input
+            st.session_state.rag_user_input = ""
 
     st.title("📚 RAG Chatbot")
 
@@ -113,14 +137,24 @@ def rag_chat_section():
     if st.session_state.rag_chat_history:
         with st.session_state.rag_response_container:
             for msg in st.session_state.rag_chat_history:
-                align = "flex-end" if msg["role"] == "user" else "flex-start"
-                bg_color = "#1f1919" if msg["role"] == "user" else "#1f1919"
-                st.markdown(
-                    f'<div style="display: flex; justify-content: {align}; margin-bottom: 10px;">'
-                    f'<div style="background-color: {bg_color}; padding: 10px; border-radius: 5px; max-width: 70%;">'
-                    f'{msg["content"]}</div></div>', unsafe_allow_html=True
-                )
+                st.markdown(render_message(msg["role"], msg["content"]), unsafe_allow_html=True)
+
+    if st.session_state.rag_pending_message:
+        message = st.session_state.rag_pending_message
+        st.session_state.rag_pending_message = None
+        with st.session_state.rag_response_container:
+            st.markdown(render_message("user", message), unsafe_allow_html=True)
+            try:
+                payload = {
+                    "message": message,
+                    "session_id": st.session_state.rag_session_id,
+                    "top_k": 3
+                }
+                reply, _ = stream_reply(f"{FASTAPI_URL}/llm/rag-chat", payload, st.empty())
+                st.session_state.rag_chat_history.append({"role": "user", "content": message})
+                st.session_state.rag_chat_history.append({"role": "assistant", "content": reply})
+            except Exception as e:
+                st.error(f"Error sending RAG message: {e}")
 
     st.text_input("Ask something with document context:", key="rag_user_input", on_change=send_rag_message)
     st.button("Send (RAG)", on_click=send_rag_message)
-
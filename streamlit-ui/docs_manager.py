@@ -24,26 +24,62 @@ def docs_manager_section():
                     st.error(f"Upload failed: {e}")
 
     elif doc_tab == "View Documents":
-        try:
-            limit = st.slider("Number of documents to fetch", 1, 100, 10)
-            response = requests.get(f"{FASTAPI_URL}/docs/list-docs", params={"limit": limit})
-            response.raise_for_status()
-            docs = response.json().get("documents", [])
-            if docs:
-                for doc in docs:
-                    col1, col2 = st.columns([0.9, 0.1])
-                    with col1:
-                        st.write(doc["text"])
-                    with col2:
-                        if st.button("🗑️", key=f"delete_{doc['id']}"):
-                            try:
-                                del_response = requests.delete(f"{FASTAPI_URL}/docs/delete-doc/{doc['id']}")
-                                del_response.raise_for_status()
-                                st.success(f"Deleted document {doc['id']}")
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"Failed to delete document: {e}")
-            else:
-                st.info("No documents found.")
-        except Exception as e:
-            st.error(f"Failed to load documents: {e}")
+        limit = st.slider("Documents per page", 1, 100, 10)
+        # Pages already loaded are kept in the session; "Load more" follows the cursor
+        if st.session_state.get("docs_page_size") != limit or st.button("Refresh"):
+            st.session_state.docs_page_size = limit
+            st.session_state.docs = []
+            st.session_state.docs_cursor = None
+            load_docs_page(limit)
+
+        docs = st.session_state.docs
+        if docs:
+            selected = []
+            for doc in list(docs):
+                col0, col1, col2 = st.columns([0.05, 0.85, 0.1])
+                with col0:
+                    if st.checkbox("select", key=f"select_{doc['id']}", label_visibility="collapsed"):
+                        selected.append(doc["id"])
+                with col1:
+                    st.write(doc["text"])
+                with col2:
+                    # Listed ids are parent ids, so this deletes every chunk of the document
+                    if st.button("🗑️", key=f"delete_{doc['id']}"):
+                        try:
+                            del_response = requests.delete(f"{FASTAPI_URL}/docs/delete-doc/{doc['id']}")
+                            del_response.raise_for_status()
+                            docs.remove(doc)
+                            st.success(f"Deleted document {doc['id']}")
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Failed to delete document: {e}")
+            if selected and st.button(f"Delete {len(selected)} selected"):
+                try:
+                    del_response = requests.post(f"{FASTAPI_URL}/docs/delete-docs", json={"ids": selected})
+                    del_response.raise_for_status()
+                    removed = set(selected)
+                    st.session_state.docs = [doc for doc in docs if doc["id"] not in removed]
+                    st.success(del_response.json().get("message", "Documents deleted."))
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Failed to delete documents: {e}")
+            if st.session_state.docs_cursor and st.button("Load more"):
+                load_docs_page(limit, st.session_state.docs_cursor)
+                st.rerun()
+        else:
+            st.info("No documents found.")
+
+
+def load_docs_page(limit, cursor=None):
+    try:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = requests.get(f"{FASTAPI_URL}/docs/list-docs", params=params)
+        response.raise_for_status()
+        page = response.json()
+        st.session_state.docs.extend(page.get("documents", []))
+        st.session_state.docs_cursor = page.get("next_cursor")
+    except Exception as e:
+        st.session_state.docs_cursor = None
+        st.error(f"Failed to load documents (press Refresh to start over): {e}")